@@ -1,10 +1,22 @@
 import streamlit as st
+import io
+import json
+import tempfile
 from datetime import datetime, timedelta, timezone, date
 import pandas as pd
+import numpy as np
 import auth
 import database
 import calendar
 import utils
+import schedule
+import reports
+import worktime
+import cache
+import instrument
+import export
+import importer
+import leave
 
 # --- 0. 日本時間の設定 ---
 JST = timezone(timedelta(hours=+9))
@@ -25,70 +37,131 @@ MEMBERS_CONFIG = [
     ("眞田", "1234", "カヌーアカデミー", "staff", "", "", ""),
 ]
 
+# 管理者だけに表示するメニュー
+ADMIN_MENU = ["月次集計", "年間計画", "休暇管理", "予定作成", "データ出力", "データ取込", "パフォーマンス"]
+
 # 休暇種類の選択肢
 LEAVE_TYPES = ["", "公休", "休日勤務", "有給休暇", "振替休暇", "特別休暇", "早退", "遅刻"]
 
 # --- 2. 自動メンバー登録 & 予定作成ロジック ---
+@st.cache_resource
 def initialize_system():
+    # スキーマの作成・移行とメンバー登録はプロセスごとに1回だけ行う（再実行のたびには行わない）
     database.create_tables()
-    for name, pw, dept, role, _, _, _ in MEMBERS_CONFIG:
-        if not database.get_user_by_username(name):
-            database.create_user(name, pw, dept, role)
+    database.sync_users([(name, pw, dept, role) for name, pw, dept, role, _, _, _ in MEMBERS_CONFIG])
+    return database.get_schema_version()
+
+def member_schedules():
+    # 予定作成に使う (user_id, 開始, 終了, 勤務パターン)。user_id はユーザー名と同じ
+    return [(name, ps, pe, ht) for name, _, _, _, ps, pe, ht in MEMBERS_CONFIG]
 
+@instrument.timed('view')
 def auto_generate_schedule(user, year, month):
-    num_days = calendar.monthrange(year, month)[1]
-    existing_records = database.get_monthly_records(user['id'], year, month)
-    
-    config = next((m for m in MEMBERS_CONFIG if m[0] == user['username']), None)
+    # 記録が無い出勤日の予定をまとめて作る。表示より先に呼ぶので再実行は不要
+    config = next((m for m in member_schedules() if m[0] == user['username']), None)
     if config:
-        name, _, _, _, def_start, def_end, holiday_type = config
-        if def_start and def_end:
-            updated = False
-            for day in range(1, num_days + 1):
-                if day in existing_records: continue
-                
-                t_date = date(year, month, day)
-                weekday = t_date.weekday()
-                is_holiday = utils.is_jp_holiday(t_date)
-                
-                skip = False
-                if holiday_type == "sh" and (weekday >= 5 or is_holiday): skip = True
-                elif holiday_type == "sun_holi" and (weekday == 6 or is_holiday): skip = True
-                elif holiday_type == "sat" and weekday == 5: skip = True
-                elif holiday_type == "sat_holi" and (weekday == 5 or is_holiday): skip = True
-                
-                if not skip:
-                    dt_ps = datetime.strptime(def_start, "%H:%M")
-                    dt_pe = datetime.strptime(def_end, "%H:%M")
-                    database.upsert_attendance_record(
-                        user['id'], t_date,
-                        scheduled_start_time=datetime.combine(t_date, dt_ps.time()),
-                        scheduled_end_time=datetime.combine(t_date, dt_pe.time()),
-                        scheduled_break_duration=60 
-                    )
-                    updated = True
-            if updated: st.rerun()
+        _, def_start, def_end, holiday_type = config
+        # 同じ version の月は作成済みなので、再実行のたびに調べ直さない
+        key = (user['id'], year, month, database.get_month_version(user['id'], year, month))
+        cache.schedule_checked.get_or_compute(
+            key, lambda: schedule.generate_schedule(user['id'], def_start, def_end, holiday_type, year, month))
 
 initialize_system()
 
 # --- ヘルパー関数 ---
-def try_parse_datetime(dt_str):
-    if not dt_str: return None
-    for fmt in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S'):
-        try: return datetime.strptime(dt_str, fmt)
-        except ValueError: pass
-    return None
-
-def normalize_time_str(t_str):
-    if not t_str: return ""
-    table = str.maketrans({chr(0xFF10 + i): chr(0x30 + i) for i in range(10)})
-    t_str = t_str.translate(table)
-    t_str = t_str.replace("：", ":").strip()
-    return t_str
-
-def to_float(val):
-    try: return float(val)
-    except: return 0.0
+# 編集モードで書き換える列（work_tag などはそのまま残す）
+EDITOR_FIELDS = [
+    'start_min', 'end_min', 'break_duration', 'manual_work_time', 'note', 'leave_type',
+    'scheduled_start_min', 'scheduled_end_min', 'scheduled_break_duration'
+]
+
+def build_day_row(y, m, day, rec):
+    # 1日分の表示値と計算用の分数を作る
+    d_obj = date(y, m, day)
+    wk = ["月", "火", "水", "木", "金", "土", "日"][d_obj.weekday()]
+    pb = rec.get('scheduled_break_duration') or 60
+    ab = 60 if rec.get('break_duration') is None else rec['break_duration']
+    return {
+        "day": day, "wk": wk,
+        "ps": worktime.format_minutes(rec.get('scheduled_start_min')),
+        "pe": worktime.format_minutes(rec.get('scheduled_end_min')), "pb": pb / 60,
+        "as": worktime.format_minutes(rec.get('start_min')),
+        "ae": worktime.format_minutes(rec.get('end_min')), "ab": ab / 60,
+        # ★Noneが表示されないように修正
+        "nt": rec.get('note') or "", "lt": rec.get('leave_type') or "",
+        "minutes": {
+            'plan_start': rec.get('scheduled_start_min'), 'plan_end': rec.get('scheduled_end_min'), 'plan_break': pb,
+            'start': rec.get('start_min'), 'end': rec.get('end_min'), 'break': ab,
+            'manual': rec.get('manual_work_time'),
+        }
+    }
+
+def build_month_rows(y, m, records):
+    # 1か月分の行を作り、予定・実績の時間は worktime でまとめて計算する
+    num_days = calendar.monthrange(y, m)[1]
+    rows = [build_day_row(y, m, day, records.get(day, {})) for day in range(1, num_days + 1)]
+    calc = worktime.compute(pd.DataFrame([r['minutes'] for r in rows]))
+    for r, pt, at in zip(rows, calc['plan_work'], calc['actual_work']):
+        r['pt'] = pt / 60; r['at'] = at / 60
+    return rows, hour_totals(calc)
+
+def hour_totals(calc):
+    t = worktime.totals(calc)
+    return {'pb': t['plan_break']/60, 'pt': t['plan_work']/60, 'ab': t['actual_break']/60, 'at': t['actual_work']/60}
+
+def month_sheet(user_id, y, m):
+    # 保存済みの内容で作った勤怠表。記録の version が変わるまで使い回す
+    key = (user_id, y, m, database.get_month_version(user_id, y, m))
+    return cache.month_sheets.get_or_compute(
+        key, lambda: build_month_rows(y, m, database.get_monthly_records(user_id, y, m)))
+
+def editor_frame(rows):
+    # 編集モードの表（1行1日）。休憩と実時は時間単位
+    return pd.DataFrame({
+        "日": [r['day'] for r in rows], "曜": [r['wk'] for r in rows],
+        "予始": [r['ps'] for r in rows], "予終": [r['pe'] for r in rows], "予休": [r['pb'] for r in rows],
+        "実始": [r['as'] for r in rows], "実終": [r['ae'] for r in rows], "実休": [r['ab'] for r in rows],
+        "実時": [r['at'] for r in rows],
+        "種類": [r['lt'] for r in rows], "備考": [r['nt'] for r in rows],
+    })
+
+def leave_type_options(rows):
+    # 選択肢に無い種類（取り込んだデータなど）も、書き換えられないよう選択肢に加えて表示する
+    return LEAVE_TYPES + sorted({r['lt'] for r in rows} - set(LEAVE_TYPES))
+
+def editor_values(df):
+    """
+    編集モードの表を attendance の列の値に変換する（列ごとにまとめて処理する）
+    (値の DataFrame, 時刻の形式が正しくない日のリスト) を返す
+    """
+    vals = pd.DataFrame(index=df.index)
+    invalid = pd.Series(False, index=df.index)
+    for col, field in [("予始", 'scheduled_start_min'), ("予終", 'scheduled_end_min'),
+                       ("実始", 'start_min'), ("実終", 'end_min')]:
+        vals[field], bad = worktime.parse_hhmm_series(df[col])
+        invalid |= bad
+    # 時間 → 分は四捨五入する（切り捨てると 123分 = 2.05時間 が 122分に戻るなど、浮動小数の誤差で1分減る）
+    vals['scheduled_break_duration'] = np.rint(pd.to_numeric(df["予休"], errors='coerce').fillna(0) * 60)
+    vals['break_duration'] = np.rint(pd.to_numeric(df["実休"], errors='coerce').fillna(0) * 60)
+    # 出勤・退勤がそろっている日は計算した実績、そうでなければ手入力の時間を保存する
+    vals['manual_work_time'] = pd.to_numeric(df["実時"], errors='coerce').fillna(0) * 60
+    vals['manual_work_time'] = np.rint(worktime.compute(vals.rename(columns=worktime.DB_COLUMNS))['actual_work'])
+    # 空の種類・備考は NULL で保存する（空文字だと休暇の索引に入ってしまう）。取り込みと同じ扱い
+    for col, field in [("備考", 'note'), ("種類", 'leave_type')]:
+        text = df[col].fillna("").astype(str).str.strip()
+        vals[field] = text.where(text != "")
+    return vals, df.loc[invalid, "日"].tolist()
+
+def changed_days(y, m, days, base_vals, new_vals):
+    # 読み込んだ時点の値と比べて、1列でも変わった日だけを {日付: 列の値} で返す
+    same = (new_vals == base_vals) | (new_vals.isna() & base_vals.isna())
+    changed = {}
+    for idx in new_vals.index[~same.all(axis=1)]:
+        changed[date(y, m, int(days[idx]))] = {
+            k: None if pd.isna(v) else (int(v) if isinstance(v, float) else v)
+            for k, v in new_vals.loc[idx].items()
+        }
+    return changed
 
 # --- メイン画面 ---
 def login_page():
@@ -106,6 +179,7 @@ def login_page():
             else:
                 st.error("ユーザー名またはパスワードが間違っています")
 
+@instrument.timed('view')
 def attendance_table_view(user):
     if 'at_view_year' not in st.session_state: st.session_state['at_view_year'] = now.year
     if 'at_view_month' not in st.session_state: st.session_state['at_view_month'] = now.month
@@ -120,77 +194,14 @@ def attendance_table_view(user):
     auto_generate_schedule(user, y, m)
 
     st.header(f"勤怠表 ({y}年度 {m}月度) - {user['username']}")
-    edit_mode = st.toggle("編集モード", value=False)
-    
-    records = database.get_monthly_records(user['id'], y, m)
-    jp_days = ["月", "火", "水", "木", "金", "土", "日"]
-    num_days = calendar.monthrange(y, m)[1]
+    if database.is_archived_year(y):
+        st.caption(f"{y}年の記録はアーカイブ済みのため、表示のみできます")
+        edit_mode = False
+    else:
+        edit_mode = st.toggle("編集モード", value=False)
     
-    rows = []
-    red_rows = []
-    total_vals = {'pb':0.0, 'pt':0.0, 'ab':0.0, 'at':0.0}
-
-    for day in range(1, num_days + 1):
-        d_obj = datetime(y, m, day)
-        wk = jp_days[d_obj.weekday()]
-        if utils.is_jp_holiday(d_obj) or d_obj.weekday() >= 5: red_rows.append(day)
-        rec = records.get(day, {})
-        keys = {k: f"{k}_{day}" for k in ['ps','pe','pb','as','ae','ab','aw','nt','lt']}
-        
-        def get_v(key, db_val, is_time=False):
-            if key in st.session_state: return st.session_state[key]
-            if db_val:
-                if is_time:
-                    dt = try_parse_datetime(db_val)
-                    if dt: return dt.strftime('%H:%M')
-                return db_val
-            return ""
-
-        v_ps = get_v(keys['ps'], rec.get('scheduled_start_time'), True)
-        v_pe = get_v(keys['pe'], rec.get('scheduled_end_time'), True)
-        v_pb = to_float(st.session_state.get(keys['pb'], float(rec.get('scheduled_break_duration') or 60)/60))
-        v_as = get_v(keys['as'], rec.get('start_time'), True)
-        v_ae = get_v(keys['ae'], rec.get('end_time'), True)
-        
-        db_ab_val = rec.get('break_duration')
-        if db_ab_val is None:
-            v_ab = to_float(st.session_state.get(keys['ab'], 1.0))
-        else:
-            v_ab = to_float(st.session_state.get(keys['ab'], float(db_ab_val)/60))
-            
-        # ★Noneが表示されないように修正
-        v_nt = st.session_state.get(keys['nt'], rec.get('note') or "")
-        v_lt = st.session_state.get(keys['lt'], rec.get('leave_type') or "")
-
-        c_pt = 0.0
-        try:
-            if v_ps and v_pe:
-                t1 = datetime.strptime(normalize_time_str(v_ps), "%H:%M")
-                t2 = datetime.strptime(normalize_time_str(v_pe), "%H:%M")
-                c_pt = max(0.0, (t2-t1).total_seconds()/3600 - v_pb)
-        except: pass
-        
-        c_at_calc = 0.0
-        try:
-            if v_as and v_ae:
-                t1 = datetime.strptime(normalize_time_str(v_as), "%H:%M")
-                t2 = datetime.strptime(normalize_time_str(v_ae), "%H:%M")
-                c_at_calc = max(0.0, (t2-t1).total_seconds()/3600 - v_ab)
-        except: pass
-        
-        final_at = c_at_calc if (v_as and v_ae) else 0.0
-        if not (v_as and v_ae):
-            if keys['aw'] in st.session_state: final_at = to_float(st.session_state[keys['aw']])
-            elif rec.get('manual_work_time') is not None: final_at = float(rec['manual_work_time'])/60.0
-
-        total_vals['pb']+=v_pb; total_vals['pt']+=c_pt; total_vals['ab']+=v_ab; total_vals['at']+=final_at
-        
-        rows.append({
-            "day": day, "wk": wk,
-            "ps": v_ps, "pe": v_pe, "pb": v_pb, "pt": c_pt,
-            "as": v_as, "ae": v_ae, "ab": v_ab, "at": final_at, "nt": v_nt, "lt": v_lt,
-            "keys": keys
-        })
+    rows, total_vals = month_sheet(user['id'], y, m)
+    red_rows = [r['day'] for r in rows if not utils.is_workday(date(y, m, r['day']))]
 
     if not edit_mode:
         st.markdown("""<style>.ac-table {width:100%; border-collapse:collapse; font-size:0.9rem;} .ac-table th, .ac-table td {border:1px solid #ccc; text-align:center; padding:4px;} .ac-table th {background:#f2f2f2;} .red-text {color:red;}</style>""", unsafe_allow_html=True)
@@ -201,68 +212,201 @@ def attendance_table_view(user):
         html += f'<tr style="font-weight:bold;"><td>合計</td><td></td><td></td><td></td><td>{total_vals["pb"]:.2f}</td><td>{total_vals["pt"]:.2f}</td><td></td><td></td><td>{total_vals["ab"]:.2f}</td><td>{total_vals["at"]:.2f}</td><td></td><td></td></tr></tbody></table>'
         st.markdown(html, unsafe_allow_html=True)
     else:
-        cols_cfg = [0.4, 0.4, 1.0, 1.0, 0.7, 0.7, 1.0, 1.0, 0.7, 0.7, 1.2, 1.5]
-        h_cols = st.columns(cols_cfg)
-        headers = ["日","曜","予始","予終","予休","予時","実始","実終","実休","実時","種類","備考"]
-        for c, t in zip(h_cols, headers): c.markdown(f"**{t}**")
-        
-        for r in rows:
-            c = st.columns(cols_cfg)
-            col_mk = f":red[{r['day']}]" if r['day'] in red_rows else f"{r['day']}"
-            c[0].markdown(col_mk); c[1].markdown(f":red[{r['wk']}]" if r['day'] in red_rows else f"{r['wk']}")
-            c[2].text_input("PS", r['ps'], key=r['keys']['ps'], label_visibility="collapsed")
-            c[3].text_input("PE", r['pe'], key=r['keys']['pe'], label_visibility="collapsed")
-            c[4].text_input("PB", r['pb'], key=r['keys']['pb'], label_visibility="collapsed")
-            c[5].write(f"{r['pt']:.2f}")
-            c[6].text_input("AS", r['as'], key=r['keys']['as'], label_visibility="collapsed")
-            c[7].text_input("AE", r['ae'], key=r['keys']['ae'], label_visibility="collapsed")
-            c[8].text_input("AB", f"{r['ab']:.2f}", key=r['keys']['ab'], label_visibility="collapsed")
-            c[9].text_input("AW", f"{r['at']:.2f}", key=r['keys']['aw'], label_visibility="collapsed")
-            
-            idx = 0
-            if r['lt'] in LEAVE_TYPES: idx = LEAVE_TYPES.index(r['lt'])
-            c[10].selectbox("LT", LEAVE_TYPES, index=idx, key=r['keys']['lt'], label_visibility="collapsed")
-            
-            # ★エラーの原因だった大文字の'NT'を小文字の'nt'に修正
-            c[11].text_input("NT", r['nt'], key=r['keys']['nt'], label_visibility="collapsed")
-
-        if st.button("全データを保存", type="primary", use_container_width=True):
-            for r in rows:
-                t_date = date(y, m, r['day'])
-                s_ps = normalize_time_str(st.session_state.get(r['keys']['ps'], ""))
-                s_pe = normalize_time_str(st.session_state.get(r['keys']['pe'], ""))
-                s_pb = to_float(st.session_state.get(r['keys']['pb'], 1.0))
-                s_as = normalize_time_str(st.session_state.get(r['keys']['as'], ""))
-                s_ae = normalize_time_str(st.session_state.get(r['keys']['ae'], ""))
-                s_ab = to_float(st.session_state.get(r['keys']['ab'], 1.0))
-                s_nt = st.session_state.get(r['keys']['nt'], "")
-                s_lt = st.session_state.get(r['keys']['lt'], "")
-                s_aw_man = to_float(st.session_state.get(r['keys']['aw'], 0.0))
-                
-                dt_ps = datetime.strptime(s_ps, "%H:%M") if s_ps else None
-                dt_pe = datetime.strptime(s_pe, "%H:%M") if s_pe else None
-                dt_as = datetime.strptime(s_as, "%H:%M") if s_as else None
-                dt_ae = datetime.strptime(s_ae, "%H:%M") if s_ae else None
-                
-                mins = int(max(0.0, (dt_ae-dt_as).total_seconds()/3600 - s_ab)*60) if (dt_as and dt_ae) else int(s_aw_man*60)
-                
-                database.upsert_attendance_record(
-                    user['id'], t_date,
-                    start_time=datetime.combine(t_date, dt_as.time()) if dt_as else None,
-                    end_time=datetime.combine(t_date, dt_ae.time()) if dt_ae else None,
-                    break_duration=int(s_ab*60), manual_work_time=mins, note=s_nt,
-                    leave_type=s_lt,
-                    scheduled_start_time=datetime.combine(t_date, dt_ps.time()) if dt_ps else None,
-                    scheduled_end_time=datetime.combine(t_date, dt_pe.time()) if dt_pe else None,
-                    scheduled_break_duration=int(s_pb*60)
-                )
+        base_df = editor_frame(rows)
+        version = database.get_month_version(user['id'], y, m)
+        # 保存すると version が変わり、表は保存後の内容で作り直される
+        edited = st.data_editor(
+            base_df, key=f"at_editor_{user['id']}_{y}_{m}_{version}",
+            hide_index=True, num_rows="fixed", use_container_width=True, height=35 * (len(rows) + 1) + 3,
+            disabled=["日", "曜"],
+            column_config={
+                "予休": st.column_config.NumberColumn(format="%.2f", min_value=0.0, step=0.25),
+                "実休": st.column_config.NumberColumn(format="%.2f", min_value=0.0, step=0.25),
+                "実時": st.column_config.NumberColumn(format="%.2f", min_value=0.0, step=0.25),
+                "種類": st.column_config.SelectboxColumn(options=leave_type_options(rows)),
+            },
+        )
+        new_vals, invalid_days = editor_values(edited)
+        if invalid_days:
+            st.error("時刻は HH:MM の形式で入力してください: " + ", ".join(f"{d}日" for d in invalid_days))
+        else:
+            t = hour_totals(worktime.compute(new_vals.rename(columns=worktime.DB_COLUMNS)))
+            st.caption(f"合計　予定 {t['pt']:.2f} 時間 / 実績 {t['at']:.2f} 時間")
+
+        if st.button("全データを保存", type="primary", use_container_width=True, disabled=bool(invalid_days)):
+            # 読み込んだ時点から内容が変わった日だけを書き込む
+            base_vals, _ = editor_values(base_df)
+            changed = changed_days(y, m, base_df["日"], base_vals, new_vals)
+            database.upsert_attendance_records(user['id'], changed, fields=EDITOR_FIELDS)
             st.success("保存しました！"); st.rerun()
 
+@instrument.timed('view')
+def monthly_report_view():
+    st.header("月次集計（全メンバー）")
+    c1, c2 = st.columns([1, 4])
+    with c1:
+        y = st.number_input("年", value=now.year, min_value=2024, max_value=2030, key="rp_year")
+        m = st.number_input("月", value=now.month, min_value=1, max_value=12, key="rp_month")
+    df = reports.monthly_rollup(y, m, LEAVE_TYPES)
+    st.subheader("部署別")
+    st.dataframe(reports.department_rollup(df), hide_index=True, use_container_width=True)
+    st.subheader("メンバー別")
+    st.dataframe(df, hide_index=True, use_container_width=True)
+
+@instrument.timed('view')
+def annual_plan_view():
+    st.header("年間計画と実績")
+    c1, c2 = st.columns([1, 4])
+    with c1:
+        y = st.number_input("年", value=now.year, min_value=2024, max_value=2030, key="ap_year")
+    patterns = {name: ht for name, _, _, _, _, _, ht in MEMBERS_CONFIG}
+    df, monthly = reports.annual_plan_rollup(y, patterns, now.date())
+    st.caption("実績累計は月次サマリーから集計。見込み = 実績累計 + 残り出勤日 × 1日平均")
+
+    # 年間計画の列だけ編集できる
+    edited = st.data_editor(
+        df, key=f"ap_editor_{y}", hide_index=True, use_container_width=True,
+        disabled=[c for c in df.columns if c != '年間計画'],
+        column_config={"年間計画": st.column_config.NumberColumn(min_value=0, step=10, format="%d")},
+    )
+    if st.button("年間計画を保存", type="primary"):
+        for name, old, new in zip(df['氏名'], df['年間計画'], edited['年間計画']):
+            if pd.notna(new) and (pd.isna(old) or int(new) != int(old)):
+                database.set_annual_plan(name, y, int(new))
+        st.success("保存しました！"); st.rerun()
+
+    if not monthly.empty:
+        member = st.selectbox("メンバー", df['氏名'], key="ap_member")
+        chart = monthly[monthly['氏名'] == member].set_index('月')[['実績累計', '計画ペース']]
+        st.line_chart(chart)
+
+@instrument.timed('view')
+def leave_admin_view():
+    st.header("休暇の付与と残り")
+    c1, c2 = st.columns([1, 4])
+    with c1:
+        y = st.number_input("年", value=now.year, min_value=2024, max_value=2030, key="lv_year")
+    st.caption("残り = 付与 + 繰越 - 取得。振替休暇の付与は休日勤務の日数です")
+    st.dataframe(reports.leave_balance_rollup(y), hide_index=True, use_container_width=True)
+
+    users = database.get_users()
+    names = {u['username']: u['id'] for u in users}
+    with st.form("lv_grant", clear_on_submit=True):
+        st.subheader("付与の登録")
+        f1, f2, f3, f4 = st.columns(4)
+        name = f1.selectbox("メンバー", list(names))
+        leave_type = f2.selectbox("種類", leave.GRANT_TYPES)
+        grant_date = f3.date_input("付与日", value=date(y, 4, 1))
+        days = f4.number_input("日数", value=10.0, min_value=0.5, step=0.5)
+        note = st.text_input("備考")
+        if st.form_submit_button("登録", type="primary"):
+            database.add_leave_grant(names[name], leave_type, grant_date, days, note=note or None)
+            st.success("登録しました！"); st.rerun()
+
+    grants = pd.DataFrame(database.get_leave_grants(date(y, 1, 1), date(y + 1, 1, 1)))
+    if not grants.empty:
+        st.subheader(f"{y}年の付与・繰越")
+        st.dataframe(grants.rename(columns={'user_id': '氏名', 'leave_type': '種類', 'grant_date': '日付',
+                                            'days': '日数', 'kind': '区分', 'note': '備考'}),
+                     hide_index=True, use_container_width=True)
+        d1, d2 = st.columns([1, 4])
+        grant_id = d1.selectbox("削除する id", grants['id'], key="lv_delete_id")
+        if d2.button("削除"):
+            database.delete_leave_grant(int(grant_id)); st.rerun()
+    if st.button(f"{y}年の{leave.PAID_LEAVE}の残りを{y + 1}年へ繰り越す"):
+        st.success(f"{leave.carry_over(y)}人分を繰り越しました"); st.rerun()
+
+    st.subheader("休日勤務と振替休暇の組")
+    member = st.selectbox("メンバー", list(names), key="lv_member")
+    p = leave.pair_substitute_days(date(y, 1, 1), date(y + 1, 1, 1), [names[member]]).get(names[member])
+    if not p:
+        st.info("休日勤務・振替休暇はありません")
+    else:
+        st.dataframe(pd.DataFrame(p['pairs'], columns=["休日勤務", "振替休暇"]), hide_index=True)
+        if p['unpaired_work']:
+            st.write("振替休暇をまだ取っていない休日勤務: " + ", ".join(p['unpaired_work']))
+        if p['unpaired_leave']:
+            st.warning("休日勤務と組になっていない振替休暇: " + ", ".join(p['unpaired_leave']))
+
+def schedule_admin_view():
+    st.header("予定の一括作成")
+    st.caption("記録がまだ無い出勤日に、メンバー全員分の予定を作成します（入力済みの日は変更しません）")
+    y = st.number_input("年", value=now.year, min_value=2024, max_value=2030, key="sg_year")
+    target = st.selectbox("対象", ["1年分"] + [f"{i}月" for i in range(1, 13)], key="sg_target")
+    if st.button("予定を作成", type="primary"):
+        month = None if target == "1年分" else int(target[:-1])
+        created = schedule.generate_schedules(member_schedules(), y, month)
+        st.success(f"{created}日分の予定を作成しました")
+
+# 書き出しの形式: 表示名 → (形式, CSV の内容, 拡張子)
+EXPORT_FORMATS = {
+    "Excel（明細・合計）": ('xlsx', None, 'xlsx'),
+    "CSV（明細）": ('csv', 'day', 'csv'),
+    "CSV（メンバー別合計）": ('csv', 'total', 'csv'),
+}
+
+def export_file(fmt, kind, start, end, departments):
+    # 一時ファイルへ1行ずつ書き出してから、ダウンロード用に読み込む
+    with tempfile.TemporaryFile('w+b') as f:
+        if fmt == 'xlsx':
+            export.write_xlsx(f, start, end, departments)
+        else:
+            text = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+            export.write_csv(text, start, end, departments, kind=kind)
+            text.flush(); text.detach()
+        f.seek(0)
+        return f.read()
+
+def export_view():
+    st.header("給与データの書き出し")
+    c1, c2 = st.columns(2)
+    start = c1.date_input("開始日", value=date(now.year, now.month, 1), key="ex_start")
+    end = c2.date_input("終了日（この日を含む）", value=now.date(), key="ex_end")
+    departments = st.multiselect("部署（未選択なら全部署）",
+                                 sorted({u['department'] for u in database.get_users() if u['department']}), key="ex_dept")
+    formats = [k for k, v in EXPORT_FORMATS.items() if v[0] != 'xlsx' or export.openpyxl is not None]
+    label = st.radio("形式", formats, horizontal=True, key="ex_format")
+    if end < start:
+        st.error("終了日は開始日以降にしてください")
+        return
+    fmt, kind, ext = EXPORT_FORMATS[label]
+    name = f"勤怠_{start:%Y%m%d}-{end:%Y%m%d}.{ext}"
+    # ファイルはボタンを押したときに作る（作ったファイルをセッションに持ち続けない）
+    st.download_button(f"{name} をダウンロード",
+                       lambda: export_file(fmt, kind, start, end + timedelta(days=1), departments or None),
+                       file_name=name, type="primary")
+
+def import_view():
+    st.header("勤怠データの取り込み")
+    st.caption("CSV / Excel の勤怠表を取り込みます。見出しは「データ出力」の明細と同じです"
+               "（氏名・日付は必須。ファイルにある列だけを書き換えます）")
+    uploaded = st.file_uploader("ファイル", type=["csv", "xlsx"], key="im_file")
+    dry_run = st.checkbox("検査だけ行う（書き込まない）", key="im_dry_run")
+    if uploaded and st.button("取り込む", type="primary"):
+        try:
+            result = importer.import_table(importer.read_table(uploaded, uploaded.name), dry_run=dry_run)
+        except ValueError as e:
+            st.error(f"取り込めません: {e}")
+        else:
+            st.session_state['im_result'] = (uploaded.name, dry_run, result)
+    if 'im_result' in st.session_state:
+        name, was_dry_run, result = st.session_state['im_result']
+        rejected = result['rejected']
+        if was_dry_run:
+            st.info(f"{name}: {result['rows']}行中 {result['rows'] - len(rejected)}行を取り込めます（{len(rejected)}行は除外）")
+        else:
+            st.success(f"{name}: {result['loaded']}行を取り込みました（{len(rejected)}行は除外）")
+        if len(rejected):
+            st.dataframe(rejected, hide_index=True, use_container_width=True)
+            st.download_button("除外した行を CSV で保存", rejected.to_csv(index=False).encode('utf-8-sig'),
+                               file_name="rejected.csv", mime="text/csv")
+
+@instrument.timed('view')
 def staff_dashboard(user):
     st.header(f"本日の状況 - {user['username']}")
     st.write(f"現在時刻: {now.strftime('%H:%M')}")
     rec = database.get_today_record(user['id'])
-    if not rec or (not rec.get('start_time') and not rec.get('end_time')):
+    if not rec or (rec.get('start_min') is None and rec.get('end_min') is None):
         if st.button("【 出 勤 】", type="primary", use_container_width=True):
             database.clock_in(user['id'], "Academy", start_time=now); st.rerun()
     elif rec.get('status') == 'working':
@@ -270,8 +414,58 @@ def staff_dashboard(user):
             database.clock_out(user['id'], end_time=now); st.rerun()
     else:
         st.success("本日の業務は終了しました")
+    
+    # 今月の合計は月次サマリーから読む（日ごとの記録は集計し直さない）
+    summary = database.get_monthly_summary(user['id'], now.year, now.month)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("今月の実績時間", f"{summary['actual_work']/60:.2f}")
+    c2.metric("今月の予定時間", f"{summary['plan_work']/60:.2f}")
+    c3.metric("出勤日数", summary['work_days'])
+
+    # 休暇の残り（今年の付与・繰越と取得から）
+    balances = leave.year_balances(now.year, [user['id']]).get(user['id'], {})
+    cols = st.columns(len(balances) or 1)
+    for col, (leave_type, b) in zip(cols, balances.items()):
+        col.metric(f"{leave_type}の残り", f"{b['balance']:g}日", help=f"付与 {b['granted']:g} / 繰越 {b['carried']:g} / 取得 {b['used']:g}")
+
+def performance_view():
+    st.header("パフォーマンス")
+    c1, c2 = st.columns(2)
+    enabled = c1.toggle("計測する", value=instrument.ENABLED)
+    slow_ms = c2.number_input("低速ログのしきい値（ms）", value=float(instrument.SLOW_MS), min_value=0.0, step=10.0)
+    instrument.configure(enabled=enabled, slow_ms=slow_ms)
+
+    # この画面を開く直前の再実行（前に表示していた画面）の内訳
+    prev = st.session_state.get('perf_prev_rerun')
+    if prev:
+        t = instrument.rerun_totals(prev)
+        st.subheader("直前の再実行")
+        m1, m2, m3, m4, m5 = st.columns(5)
+        m1.metric("画面の時間 (ms)", f"{t['view_ms']:.1f}")
+        m2.metric("DBの時間 (ms)", f"{t['db_ms']:.1f}")
+        m3.metric("DB呼び出し", t['db_calls'])
+        m4.metric("行数", t['rows'])
+        m5.metric("コミット", t['commits'])
+        st.dataframe(pd.DataFrame(instrument.summary(prev)), hide_index=True, use_container_width=True)
+
+    st.subheader("関数別（記録全体）")
+    st.dataframe(pd.DataFrame(instrument.summary()), hide_index=True, use_container_width=True)
+    st.subheader(f"低速ログ（{instrument.SLOW_MS:.0f}ms 以上）")
+    slow = pd.DataFrame(instrument.slow_log())
+    if not slow.empty:
+        slow['time'] = pd.to_datetime(slow['time'], unit='s', utc=True).dt.tz_convert(JST).dt.strftime('%m/%d %H:%M:%S')
+    st.dataframe(slow, hide_index=True, use_container_width=True)
+
+    c1, c2 = st.columns(2)
+    c1.download_button("JSON で書き出す", json.dumps(instrument.export(), ensure_ascii=False, indent=2),
+                       file_name=f"performance_{now.strftime('%Y%m%d_%H%M')}.json", mime="application/json")
+    if c2.button("記録を消去"):
+        instrument.clear(); st.rerun()
 
 def main():
+    # 計測の記録を再実行ごとにまとめる
+    st.session_state['perf_prev_rerun'] = st.session_state.get('perf_rerun')
+    st.session_state['perf_rerun'] = instrument.start_rerun()
     if 'app_phase' not in st.session_state: st.session_state['app_phase'] = 'portal'
     if st.session_state['app_phase'] == 'portal':
         st.title("TSC 勤怠システム")
@@ -281,10 +475,22 @@ def main():
     elif st.session_state['app_phase'] == 'dashboard':
         user = st.session_state.get('user')
         with st.sidebar:
-            mode = st.radio("メニュー", ["本日の状況", "勤怠表"])
+            menu = ["本日の状況", "勤怠表"]
+            if user.get('role') == 'admin': menu += ADMIN_MENU
+            mode = st.radio("メニュー", menu)
             if st.button("ログアウト"): del st.session_state['user']; st.session_state['app_phase'] = 'portal'; st.rerun()
+            if user.get('role') == 'admin':
+                with st.expander("キャッシュ"):
+                    st.dataframe(pd.DataFrame(cache.stats()), hide_index=True)
         if mode == "本日の状況": staff_dashboard(user)
         elif mode == "勤怠表": attendance_table_view(user)
+        elif mode == "月次集計": monthly_report_view()
+        elif mode == "年間計画": annual_plan_view()
+        elif mode == "休暇管理": leave_admin_view()
+        elif mode == "予定作成": schedule_admin_view()
+        elif mode == "データ出力": export_view()
+        elif mode == "データ取込": import_view()
+        elif mode == "パフォーマンス": performance_view()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
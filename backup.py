@@ -0,0 +1,229 @@
+import os
+import pathlib
+import re
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+import cache
+import database
+
+# --- バックアップ ---
+# sqlite3 のオンラインバックアップで、動いているデータベースを少しずつ（PAGES_PER_STEP ページずつ）写す
+# WAL モードなので写している間も打刻は待たされない。途中で書き込みがあると SQLite が最初から写し直す
+# 使い方: python maintenance.py backup [--every 3600]   /   python maintenance.py restore --from <ファイル>
+
+BACKUP_DIR = 'backups'
+PAGES_PER_STEP = 256    # 1回に写すページ数（4KB のページで 1MB）
+STEP_PAUSE = 0.002      # 1回写すごとに休む秒数（その間に打刻の書き込みが入れる）
+MAX_RESTARTS = 20       # 書き込みが続いて写し直しがこれを超えたら、1回でまとめて写す
+KEEP_LAST = 24          # 新しい順に残すスナップショットの数
+KEEP_DAILY = 14         # そのほかに、日ごとの最後のスナップショットを残す日数
+
+def _stem(db_name):
+    return os.path.splitext(os.path.basename(db_name))[0]
+
+def backup_dir(db_name=None):
+    db_name = db_name or database.DB_NAME
+    return os.path.join(os.path.dirname(os.path.abspath(db_name)), BACKUP_DIR)
+
+def _snapshot_pattern(db_name):
+    # スナップショットのファイル名: <データベース名>_YYYYmmdd_HHMMSS.db（復元前の退避は含めない）
+    return re.compile(re.escape(_stem(db_name)) + r'_(\d{8}_\d{6})\.db$')
+
+class _TooManyRestarts(Exception):
+    pass
+
+def copy_database(src_path, dest_path, pages=PAGES_PER_STEP, pause=STEP_PAUSE):
+    """
+    src_path を dest_path へオンラインバックアップで写し、{'pages', 'steps', 'restarts', 'whole', 'ms'} を返す
+    アプリの接続とは別の接続で読むので、写している間もアプリの読み書きは止まらない
+    写し直しが MAX_RESTARTS 回を超えたら、1回の読み取りでまとめて写す（whole が真）
+    WAL モードでは読み取り中も書き込みは進むので、まとめて写しても打刻は待たされない（チェックポイントが遅れるだけ）
+    """
+    src = sqlite3.connect(src_path, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    dst = sqlite3.connect(dest_path)
+    steps, restarts, last, whole = 0, 0, None, False
+
+    def progress(status, remaining, total):
+        nonlocal steps, restarts, last
+        steps += 1
+        if last is not None and remaining >= last:
+            # 残りが減っていない = 元のデータベースが書き換わり、最初から写し直している
+            # （写し始めてすぐ書き換わると、残りは前と同じ数に戻るだけで増えはしない）
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last = remaining
+        if remaining:
+            time.sleep(pause)
+
+    t0 = time.perf_counter()
+    try:
+        try:
+            src.backup(dst, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            whole = True
+            src.backup(dst)
+        # 写した先は WAL のままなので、1つのファイルで完結するよう戻す
+        dst.execute("PRAGMA journal_mode=DELETE")
+        total = dst.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    return {'pages': total, 'steps': steps, 'restarts': restarts, 'whole': whole,
+            'ms': (time.perf_counter() - t0) * 1000}
+
+def check_integrity(path):
+    """
+    path のデータベースを PRAGMA integrity_check で調べ、問題の一覧を返す（空なら問題なし）
+    """
+    if not os.path.exists(path):
+        return [f"{path} がありません"]
+    try:
+        conn = sqlite3.connect(_readonly_uri(path), uri=True)
+        try:
+            rows = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+        finally:
+            conn.close()
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    return [] if rows == ['ok'] else rows
+
+def _readonly_uri(path):
+    # 読み取り専用で開く URI（調べるだけでファイルを書き換えない）
+    return pathlib.Path(os.path.abspath(path)).as_uri() + "?mode=ro"
+
+def _copy_archives(db_name, dest_dir):
+    # アーカイブは作った後は変わらないので、まだ写していないファイルだけを写す
+    src_dir = os.path.join(os.path.dirname(os.path.abspath(db_name)), database.ARCHIVE_DIR)
+    if not os.path.isdir(src_dir):
+        return 0
+    dest = os.path.join(dest_dir, database.ARCHIVE_DIR)
+    os.makedirs(dest, exist_ok=True)
+    copied = 0
+    for name in os.listdir(src_dir):
+        if name.endswith('.db') and not os.path.exists(os.path.join(dest, name)):
+            shutil.copy2(os.path.join(src_dir, name), os.path.join(dest, name))
+            copied += 1
+    return copied
+
+def list_snapshots(db_name=None):
+    """
+    スナップショットを新しい順に [{'path', 'created', 'bytes'}, ...] で返す
+    """
+    db_name = db_name or database.DB_NAME
+    directory = backup_dir(db_name)
+    if not os.path.isdir(directory):
+        return []
+    pattern = _snapshot_pattern(db_name)
+    snapshots = []
+    for name in os.listdir(directory):
+        m = pattern.match(name)
+        if m:
+            path = os.path.join(directory, name)
+            snapshots.append({'path': path, 'created': datetime.strptime(m.group(1), '%Y%m%d_%H%M%S'),
+                              'bytes': os.path.getsize(path)})
+    return sorted(snapshots, key=lambda s: s['created'], reverse=True)
+
+def rotate(db_name=None, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY):
+    """
+    新しい keep_last 個と、新しい方から keep_daily 日分の各日の最後のスナップショットを残し、ほかを消す
+    消したファイルのパスの一覧を返す
+    """
+    snapshots = list_snapshots(db_name)
+    keep = {s['path'] for s in snapshots[:keep_last]}
+    days = []
+    for s in snapshots:
+        day = s['created'].date()
+        if day not in days:
+            days.append(day)
+            if len(days) <= keep_daily:
+                keep.add(s['path'])
+    removed = [s['path'] for s in snapshots if s['path'] not in keep]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+def snapshot(db_name=None, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY, suffix=''):
+    """
+    スナップショットを1つ作り、検査してから置き、古いものを整理する
+    戻り値は copy_database の値に 'path', 'bytes', 'check_ms', 'archives'（写したアーカイブの数）, 'removed' を足したもの
+    suffix を付けたファイル（復元前の退避など）は整理の対象にならない
+    """
+    db_name = db_name or database.DB_NAME
+    directory = backup_dir(db_name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{_stem(db_name)}_{datetime.now(database.JST):%Y%m%d_%H%M%S}{suffix}.db")
+    tmp = path + '.tmp'
+    stats = copy_database(db_name, tmp)
+    t0 = time.perf_counter()
+    problems = check_integrity(tmp)
+    stats['check_ms'] = (time.perf_counter() - t0) * 1000
+    if problems:
+        os.remove(tmp)
+        raise RuntimeError("スナップショットの検査で問題が見つかりました: " + "; ".join(problems[:5]))
+    # 検査を通ったものだけを正式な名前にする（途中で止まっても壊れたスナップショットは残らない）
+    os.replace(tmp, path)
+    stats.update(path=path, bytes=os.path.getsize(path), archives=_copy_archives(db_name, directory))
+    stats['removed'] = rotate(db_name, keep_last, keep_daily) if not suffix else []
+    return stats
+
+def run_schedule(every, db_name=None, keep_last=KEEP_LAST, keep_daily=KEEP_DAILY, report=print):
+    """
+    every 秒ごとにスナップショットを作り続ける（Ctrl+C で止める）。失敗しても次の回は続ける
+    """
+    while True:
+        started = time.monotonic()
+        try:
+            report(snapshot(db_name, keep_last, keep_daily))
+        except (RuntimeError, sqlite3.Error) as e:
+            report(e)
+        time.sleep(max(0.0, every - (time.monotonic() - started)))
+
+def restore(snapshot_path, db_name=None):
+    """
+    snapshot_path を検査してから db_name（省略時は DB_NAME）へ書き戻す。今の内容は先に退避しておく
+    書き戻しの間は書き込みが待たされる（打刻は busy_timeout まで待ってから再試行する）
+    月次サマリーの version は復元前より必ず大きくする（他のプロセスのキャッシュに古い月が残らないように）
+    戻り値は {'saved': 退避したファイル, 'pages', 'ms'}
+    """
+    db_name = db_name or database.DB_NAME
+    problems = check_integrity(snapshot_path)
+    if problems:
+        raise ValueError("スナップショットが壊れています: " + "; ".join(problems[:5]))
+    saved = snapshot(db_name, suffix='_before_restore')['path']
+
+    database.DB_NAME = db_name
+    with database.read_cursor() as c:
+        has_summary = c.execute("SELECT 1 FROM sqlite_master WHERE name='monthly_summary'").fetchone()
+        before_version = c.execute("SELECT MAX(version) FROM monthly_summary").fetchone()[0] if has_summary else 0
+    database.close_connection()
+
+    src = sqlite3.connect(_readonly_uri(snapshot_path), uri=True)
+    dst = sqlite3.connect(db_name, timeout=database.BUSY_TIMEOUT_MS / 1000)
+    t0 = time.perf_counter()
+    try:
+        src.backup(dst)
+        dst.execute("PRAGMA journal_mode=WAL")
+        pages = dst.execute("PRAGMA page_count").fetchone()[0]
+    finally:
+        dst.close()
+        src.close()
+    ms = (time.perf_counter() - t0) * 1000
+
+    # 古い版のスナップショットなら移行し直し、足りないアーカイブはバックアップから戻す
+    database.migrate()
+    archive_copies = os.path.join(backup_dir(db_name), database.ARCHIVE_DIR)
+    for path in database.get_archived_years().values():
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copy2(os.path.join(archive_copies, os.path.basename(path)), path)
+    with database.transaction() as c:
+        c.execute("UPDATE monthly_summary SET version = version + ?", ((before_version or 0) + 1,))
+    cache.clear_all()
+
+    problems = check_integrity(db_name)
+    if problems:
+        raise RuntimeError(f"復元後の検査で問題が見つかりました（退避: {saved}）: " + "; ".join(problems[:5]))
+    return {'saved': saved, 'pages': pages, 'ms': ms}
\ No newline at end of file
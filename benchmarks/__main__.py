@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+from datetime import datetime
+import database
+from benchmarks import generate, scenarios
+
+# --- ベンチマークの実行 ---
+# 使い方: python -m benchmarks --users 30 --years 2 --out bench.json
+#         python -m benchmarks --compare bench.json   （前回の結果と中央値を比べる）
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, 'attendance.db')
+        users, years = generate.generate(db_name, args.users, args.years, seed=args.seed)
+        with database.read_cursor() as c:
+            rows = c.execute("SELECT COUNT(*) FROM attendance").fetchone()[0]
+        ctx = {'users': users, 'years': years}
+
+        results = {}
+        for name, scenario in scenarios.SCENARIOS.items():
+            if args.only and name not in args.only:
+                continue
+            results[name] = scenarios.measure(scenario(ctx), args.repeat)
+        if not args.only or 'clock_in_burst' in args.only:
+            results['clock_in_burst'] = scenarios.clock_in_burst(tmp, args.burst_users, args.threads, 1)
+        if not args.only or 'backup_during_burst' in args.only:
+            results['backup_during_burst'] = scenarios.backup_during_burst(tmp, args.burst_users, args.threads)
+        database.close_connection()
+
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'), 'commit': _git_commit(),
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+            'users': args.users, 'years': years, 'rows': rows, 'repeat': args.repeat, 'seed': args.seed,
+        },
+        'results': results,
+    }
+
+def _key_value(stats):
+    # 比べる値（時間は中央値、打刻は p99）
+    return stats.get('median_ms', stats.get('p99_ms'))
+
+def print_report(report, previous=None):
+    prev = (previous or {}).get('results', {})
+    print(f"データ: {report['meta']['users']}人 × {len(report['meta']['years'])}年（{report['meta']['rows']}行）")
+    for name, stats in report['results'].items():
+        value = _key_value(stats)
+        line = f"{name:<20} {value:9.2f} ms"
+        if 'throughput' in stats:
+            line += f"  ({stats['throughput']:.0f}回/秒, 失敗 {stats['errors']}回)"
+        if 'backups' in stats:
+            line += f"  [バックアップ {stats['backups']}回, 中央値 {stats['backup_ms']:.0f}ms, 写し直し {stats['restarts']}回]"
+        if name in prev and _key_value(prev[name]):
+            line += f"  前回比 {value / _key_value(prev[name]) * 100 - 100:+.1f}%"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TSC 勤怠システムのベンチマーク")
+    parser.add_argument('--users', type=int, default=30, help="生成する人数")
+    parser.add_argument('--years', type=int, default=2, help="生成する年数（前年まで）")
+    parser.add_argument('--repeat', type=int, default=50, help="場面ごとの実行回数")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--burst-users', type=int, default=200, help="同時打刻の人数")
+    parser.add_argument('--threads', type=int, default=32, help="同時打刻のスレッド数")
+    parser.add_argument('--only', nargs='*', help="実行する場面（省略時はすべて）")
+    parser.add_argument('--out', help="結果を書き出す JSON ファイル")
+    parser.add_argument('--compare', help="比べる前回の結果（JSON）")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
\ No newline at end of file
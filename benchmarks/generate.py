@@ -0,0 +1,76 @@
+import random
+from datetime import date
+import database
+import schedule
+
+# --- 試験用データの生成 ---
+# 指定した人数・年数分の予定と打刻を作る。seed が同じなら毎回同じデータになる
+
+DEPARTMENTS = ["事務局", "施設管理", "カヌーアカデミー"]
+# (開始, 終了, 勤務パターン)。予定の無いメンバー（カヌーアカデミー）は空
+PATTERNS = [
+    ("08:30", "17:15", "sh"),
+    ("09:00", "17:00", "sh"),
+    ("08:30", "17:15", "sat"),
+    ("09:00", "17:00", "sun_holi"),
+    ("", "", ""),
+]
+# 出勤日に付ける休暇などの種類と、その割合
+LEAVE_WEIGHTS = [
+    ("", 0.90), ("有給休暇", 0.04), ("振替休暇", 0.01), ("特別休暇", 0.01), ("早退", 0.02), ("遅刻", 0.02),
+]
+
+def bench_users(count):
+    """
+    (user_id, 部署, 開始, 終了, 勤務パターン) の並び。user_id はユーザー名と同じ
+    """
+    return [(f"bench{i:04d}", DEPARTMENTS[i % len(DEPARTMENTS)]) + PATTERNS[i % len(PATTERNS)]
+            for i in range(count)]
+
+def _actual(rng, plan, leave_type):
+    # 予定の日の実績（打刻）。休暇の日は打刻しない
+    if leave_type in ("有給休暇", "振替休暇", "特別休暇"):
+        return {'leave_type': leave_type}
+    start = plan['scheduled_start_min'] + rng.randint(-10, 5)
+    end = plan['scheduled_end_min'] + (rng.choice([0, 15, 30, 60, 90]) if rng.random() < 0.3 else rng.randint(0, 10))
+    if leave_type == "遅刻":
+        start += rng.randint(30, 120)
+    elif leave_type == "早退":
+        end -= rng.randint(60, 180)
+    return {'start_min': start, 'end_min': end, 'break_duration': rng.choice([45, 60, 60, 60]),
+            'leave_type': leave_type or None, 'work_tag': "Office"}
+
+def _rows_for_year(rng, def_start, def_end, holiday_type, year):
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    if def_start:
+        rows = schedule.build_schedule_rows(def_start, def_end, holiday_type, start, end)
+        leave_types, weights = zip(*LEAVE_WEIGHTS)
+        for plan in rows.values():
+            plan.update(_actual(rng, plan, rng.choices(leave_types, weights)[0]))
+        return rows
+    # 予定の無いメンバーは平日の半分ほどに手入力の練習時間を付ける
+    rows = {}
+    for o in range(start.toordinal(), end.toordinal()):
+        d = date.fromordinal(o)
+        if d.weekday() < 5 and rng.random() < 0.5:
+            rows[d] = {'manual_work_time': rng.choice([90, 120, 180]), 'work_tag': "Academy",
+                       'practice_duration': rng.choice([60, 90, 120])}
+    return rows
+
+def generate(db_name, users=30, years=2, last_year=None, seed=1):
+    """
+    db_name に試験用データを作り、(ユーザーの並び, 年の並び) を返す
+    年は last_year（省略時は前年）までの years 年分
+    """
+    database.DB_NAME = db_name
+    database.create_tables()
+    rng = random.Random(seed)
+    last_year = last_year or date.today().year - 1
+    year_list = list(range(last_year - years + 1, last_year + 1))
+    members = bench_users(users)
+    database.sync_users([(uid, "", dept, "staff") for uid, dept, _, _, _ in members])
+    with database.transaction():
+        for uid, _, def_start, def_end, holiday_type in members:
+            for year in year_list:
+                database.upsert_attendance_records(uid, _rows_for_year(rng, def_start, def_end, holiday_type, year))
+    return members, year_list
\ No newline at end of file
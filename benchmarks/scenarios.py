@@ -0,0 +1,136 @@
+import os
+import statistics
+import threading
+import time
+from datetime import date
+import backup
+import cache
+import database
+import loadtest
+import reports
+import schedule
+import worktime
+
+# --- 計測する場面 ---
+# 各場面は ctx（生成したデータの情報）を受け取り、1回分の処理を行う関数を返す
+# 同じ ctx なら毎回同じ順でユーザーと月をたどるので、実行どうしで比べられる
+
+LEAVE_TYPES = ["", "公休", "休日勤務", "有給休暇", "振替休暇", "特別休暇", "早退", "遅刻"]
+
+def _targets(ctx):
+    # (user_id, 年, 月) を順番に返し続ける
+    i = 0
+    while True:
+        uid = ctx['users'][i % len(ctx['users'])][0]
+        yield uid, ctx['years'][i % len(ctx['years'])], i % 12 + 1
+        i += 1
+
+def _month_view(records):
+    # 勤怠表と同じく、1か月分の予定・実績を worktime でまとめて計算する
+    return worktime.totals(worktime.compute(worktime.records_frame(records.values())))
+
+def month_view_cold(ctx):
+    targets = _targets(ctx)
+    def run():
+        uid, y, m = next(targets)
+        cache.clear_all()
+        _month_view(database.get_monthly_records(uid, y, m))
+    return run
+
+def month_view_warm(ctx):
+    uid, y, m = next(_targets(ctx))
+    database.get_monthly_records(uid, y, m)
+    return lambda: _month_view(database.get_monthly_records(uid, y, m))
+
+def month_save(ctx):
+    # 編集モードで1か月分を保存したときと同じく、全日の行をまとめて書き込む
+    targets = _targets(ctx)
+    def run():
+        uid, y, m = next(targets)
+        records = database.get_monthly_records(uid, y, m)
+        rows = {date(y, m, day): {**r, 'note': f"bench {time.perf_counter_ns()}"} for day, r in records.items()}
+        database.upsert_attendance_records(uid, rows)
+    return run
+
+def schedule_check(ctx):
+    # 勤怠表を開くたびの予定作成（記録がそろっている月では作るものが無いことを確かめるだけ）
+    members = {uid: (ps, pe, ht) for uid, _, ps, pe, ht in ctx['users']}
+    targets = _targets(ctx)
+    def run():
+        uid, y, m = next(targets)
+        schedule.generate_schedule(uid, *members[uid], y, m)
+    return run
+
+def admin_rollup_month(ctx):
+    targets = _targets(ctx)
+    def run():
+        _, y, m = next(targets)
+        reports.department_rollup(reports.monthly_rollup(y, m, LEAVE_TYPES))
+    return run
+
+def admin_rollup_year(ctx):
+    y = ctx['years'][-1]
+    return lambda: reports.period_rollup(date(y, 1, 1), date(y + 1, 1, 1), LEAVE_TYPES)
+
+SCENARIOS = {
+    'month_view_cold': month_view_cold,
+    'month_view_warm': month_view_warm,
+    'month_save': month_save,
+    'schedule_check': schedule_check,
+    'admin_rollup_month': admin_rollup_month,
+    'admin_rollup_year': admin_rollup_year,
+}
+
+def measure(run, repeat):
+    # 1回目は準備（接続の作成など）とみなして捨てる
+    run()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+    times.sort()
+    return {
+        'runs': repeat,
+        'min_ms': times[0] * 1000,
+        'median_ms': statistics.median(times) * 1000,
+        'p99_ms': times[min(len(times) - 1, int(len(times) * 0.99))] * 1000,
+        'mean_ms': statistics.fmean(times) * 1000,
+    }
+
+def clock_in_burst(tmp_dir, users, threads, processes):
+    # 打刻の同時実行は loadtest と同じ方法で、別のデータベースで計る
+    db_name = database.DB_NAME
+    try:
+        r = loadtest.run(os.path.join(tmp_dir, 'burst.db'), users, threads, processes, date.today())
+    finally:
+        database.DB_NAME = db_name
+    return {k: r[k] for k in ('punches', 'errors', 'throughput', 'p50_ms', 'p99_ms', 'mean_ms')}
+
+def backup_during_burst(tmp_dir, users, threads):
+    """
+    生成したデータの複製に対して打刻を同時に行い、その間バックアップを繰り返す
+    clock_in_burst の待ち時間と比べると、バックアップが打刻に与える影響がわかる
+    """
+    db_name = database.DB_NAME
+    burst = os.path.join(tmp_dir, 'backup_burst.db')
+    backup.copy_database(db_name, burst)
+    stop = threading.Event()
+    copies = []
+
+    def keep_copying():
+        while not stop.is_set():
+            copies.append(backup.copy_database(burst, os.path.join(tmp_dir, 'snapshot.db')))
+
+    worker = threading.Thread(target=keep_copying)
+    worker.start()
+    try:
+        r = loadtest.run(burst, users, threads, 1, date.today())
+    finally:
+        stop.set()
+        worker.join()
+        database.DB_NAME = db_name
+    result = {k: r[k] for k in ('punches', 'errors', 'throughput', 'p50_ms', 'p99_ms', 'mean_ms')}
+    result.update(backups=len(copies), backup_ms=statistics.median(c['ms'] for c in copies) if copies else 0.0,
+                  restarts=sum(c['restarts'] for c in copies), whole=sum(c['whole'] for c in copies))
+    return result
\ No newline at end of file
@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+
+# --- プロセス内キャッシュ ---
+# Streamlit は操作のたびにスクリプト全体を再実行するので、同じ月の読み込みや計算を使い回す
+# 鍵には書き込みのたびに増える version を含めるため、保存後に古い値が返ることはない
+
+class LRUCache:
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        # 計算中はロックを持たない（同じ鍵を同時に計算しても結果は同じ）
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, match=None):
+        # match を省略すると全件、指定すると match(key) が真の鍵だけを消す
+        with self._lock:
+            if match is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if match(k)]:
+                    del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name, 'size': len(self._data), 'maxsize': self.maxsize,
+                'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+# 1か月分の記録（鍵: user_id, 年, 月, version）
+monthly_records = LRUCache('monthly_records', 512)
+# 勤怠表の計算結果（鍵: user_id, 年, 月, version）
+month_sheets = LRUCache('month_sheets', 256)
+# ユーザー情報（鍵: username）
+users = LRUCache('users', 256)
+# 予定を作り終えた月（鍵: user_id, 年, 月, version）
+schedule_checked = LRUCache('schedule_checked', 1024)
+
+ALL_CACHES = [monthly_records, month_sheets, users, schedule_checked]
+
+def stats():
+    return [c.stats() for c in ALL_CACHES]
+
+def clear_all():
+    for c in ALL_CACHES:
+        c.invalidate()
\ No newline at end of file
@@ -1,173 +1,1004 @@
+import itertools
+import os
+import pathlib
+import random
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta, timezone
+import worktime
+import cache
+import instrument
 
 # --- 日本時間の設定 ---
 JST = timezone(timedelta(hours=+9))
 DB_NAME = 'attendance.db'
 
+# --- 接続管理 ---
+# 接続はスレッドごとに1本だけ作って使い回す（Streamlitのワーカースレッド単位）
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",          # 読み込みと書き込みを同時に行えるようにする
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    "PRAGMA synchronous=NORMAL",        # WALではNORMALでも整合性は保たれる
+    "PRAGMA cache_size=-8000",          # 約8MB
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+_local = threading.local()
+
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.db_name == DB_NAME:
+        return conn
+    if conn is not None:
+        conn.close()
+    # isolation_level=None: 暗黙のトランザクションを使わず transaction() で明示的に管理する
+    # uri=True: アーカイブを読み取り専用（file:...?mode=ro）で ATTACH するため。普通のファイル名もそのまま使える
+    conn = sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+                           cached_statements=STATEMENT_CACHE_SIZE, uri=True)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _local.conn = conn
+    _local.db_name = DB_NAME
+    _local.depth = 0
+    _local.attached = {}
+    return conn
+
+def close_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+@contextmanager
+def transaction():
+    """
+    書き込み用のトランザクション。入れ子で呼ばれた場合は一番外側でまとめてコミットする
+    """
+    conn = get_connection()
+    if _local.depth > 0:
+        _local.depth += 1
+        try:
+            yield conn.cursor()
+        finally:
+            _local.depth -= 1
+        return
+    # 最初に書き込みロックを取ることで、読み込み→書き込みの昇格時の競合を避ける
+    conn.execute("BEGIN IMMEDIATE")
+    _local.depth = 1
+    try:
+        yield conn.cursor()
+        conn.execute("COMMIT")
+        instrument.record_commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        _local.depth = 0
+
+# 書き込みロックが取れない（SQLITE_BUSY）ときのやり直し。待ち時間は試すたびに倍にし、ゆらぎを加える
+WRITE_RETRIES = 5
+RETRY_BASE_DELAY = 0.05  # 秒
+
+def _is_busy(e):
+    msg = str(e).lower()
+    return 'locked' in msg or 'busy' in msg
+
+def write_with_retry(fn, retries=WRITE_RETRIES):
+    """
+    fn(カーソル) を1つのトランザクションで実行し、その戻り値を返す
+    ロックが取れなければやり直す。外側のトランザクションの中ではやり直さない（外側ごとやり直す必要がある）
+    """
+    for attempt in range(retries + 1):
+        try:
+            with transaction() as c:
+                return fn(c)
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or attempt == retries or _local.depth > 0:
+                raise
+            time.sleep(RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random()))
+
+@contextmanager
+def read_cursor():
+    """
+    参照用のカーソル。WALモードなので書き込み中でもブロックされない
+    """
+    c = get_connection().cursor()
+    try:
+        yield c
+    finally:
+        c.close()
 
 # --- ユーザー認証 ---
 def get_user_by_username(username):
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM users WHERE username=?", (username,))
-    row = c.fetchone()
-    conn.close()
+    user = cache.users.get_or_compute(username, lambda: _load_user(username))
+    if user is None:
+        # 見つからなかった結果は残さない（別の手段で登録された直後でもログインできるように）
+        cache.users.invalidate(lambda k: k == username)
+        return None
+    return dict(user)
+
+def _load_user(username):
+    with read_cursor() as c:
+        c.execute("SELECT * FROM users WHERE username=?", (username,))
+        row = c.fetchone()
     if row:
         return dict(row)
     return None
 
 def create_user(username, password, department, role):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT OR IGNORE INTO users (id, username, password, department, role) VALUES (?, ?, ?, ?, ?)", 
-              (username, username, password, department, role))
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        c.execute("INSERT OR IGNORE INTO users (id, username, password, department, role) VALUES (?, ?, ?, ?, ?)", 
+                  (username, username, password, department, role))
+    cache.users.invalidate(lambda k: k == username)
+
+def sync_users(members):
+    """
+    members: (名前, パスワード, 部署, 権限) の並び。まだ登録されていないメンバーだけを1回の executemany で追加する
+    追加した人数を返す
+    """
+    members = list(members)
+    with transaction() as c:
+        before = c.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        c.executemany("INSERT OR IGNORE INTO users (id, username, password, department, role) VALUES (?, ?, ?, ?, ?)",
+                      [(name, name, pw, dept, role) for name, pw, dept, role in members])
+        added = c.execute("SELECT COUNT(*) FROM users").fetchone()[0] - before
+    cache.users.invalidate()
+    return added
 
 # --- 基本機能（テーブル作成） ---
 def create_tables():
-    conn = get_connection()
-    c = conn.cursor()
+    migrate()
+
+def create_base_tables(c):
     c.execute('''CREATE TABLE IF NOT EXISTS users
                  (id TEXT PRIMARY KEY, username TEXT, password TEXT, department TEXT, role TEXT)''')
-    c.execute('''CREATE TABLE IF NOT EXISTS attendance
-                 (user_id TEXT, date TEXT, 
-                  start_time TEXT, end_time TEXT, 
-                  break_duration INTEGER, manual_work_time INTEGER, note TEXT,
-                  scheduled_start_time TEXT, scheduled_end_time TEXT, scheduled_break_duration INTEGER,
-                  work_tag TEXT, leave_type TEXT, practice_duration INTEGER,
-                  PRIMARY KEY (user_id, date))''')
+    # 時刻は0時からの分数で持つ（*_min）。休憩・手入力の時間も分
+    c.execute(f'''CREATE TABLE IF NOT EXISTS attendance {ATTENDANCE_SCHEMA}''')
+    migrate_time_columns(c)
     c.execute('''CREATE TABLE IF NOT EXISTS annual_plans
                  (username TEXT, year INTEGER, annual_hours INTEGER,
                   PRIMARY KEY (username, year))''')
-    conn.commit()
-    conn.close()
+
+# --- スキーマの移行 ---
+# 適用済みの段階を PRAGMA user_version に記録し、未適用の段階だけを順に実行する
+# 以前の版で作られた attendance.db（user_version = 0）にも使えるよう、各段階は何度実行しても同じ結果になる
+# 新しい変更は末尾に足す（並びを入れ替えたり途中に挟んだりしない）
+def _migrations():
+    return [
+        create_base_tables,     # 1: users / attendance / annual_plans（時刻の分数化を含む）
+        create_indexes,         # 2: 日付で引く索引
+        create_summary_table,   # 3: 月次サマリーとトリガー
+        create_archive_table,   # 4: アーカイブ済みの年の一覧
+        create_leave_tables,    # 5: 休暇の索引と付与・繰越の台帳
+        clear_empty_text,       # 6: 空文字で保存された種類・備考を NULL に直す
+    ]
+
+def get_schema_version():
+    with read_cursor() as c:
+        return c.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate():
+    """
+    未適用の移行を1トランザクションで実行し、(移行前の版, 移行後の版) を返す
+    """
+    migrations = _migrations()
+    current = get_schema_version()
+    if current >= len(migrations):
+        return current, current
+    with transaction() as c:
+        # 別のプロセスが先に移行した場合に備えて、書き込みロックを取ってから読み直す
+        current = c.execute("PRAGMA user_version").fetchone()[0]
+        for version in range(current + 1, len(migrations) + 1):
+            migrations[version - 1](c)
+            c.execute(f"PRAGMA user_version = {version}")
+    return current, max(current, len(migrations))
+
+ATTENDANCE_SCHEMA = '''(user_id TEXT, date TEXT, 
+                      start_min INTEGER, end_min INTEGER, 
+                      break_duration INTEGER, manual_work_time INTEGER, note TEXT,
+                      scheduled_start_min INTEGER, scheduled_end_min INTEGER, scheduled_break_duration INTEGER,
+                      work_tag TEXT, leave_type TEXT, practice_duration INTEGER,
+                      PRIMARY KEY (user_id, date))'''
+
+# 旧形式（'YYYY-MM-DD HH:MM:SS' の文字列）の列と、移行先の分数の列
+LEGACY_TIME_COLUMNS = {
+    'start_time': 'start_min',
+    'end_time': 'end_min',
+    'scheduled_start_time': 'scheduled_start_min',
+    'scheduled_end_time': 'scheduled_end_min',
+}
+
+def migrate_time_columns(c):
+    """
+    旧形式の attendance（時刻が文字列）を分数の列に作り替える。既に移行済みなら何もしない
+    秒は切り捨てる（勤怠表の計算も分単位）
+    """
+    c.execute("PRAGMA table_info(attendance)")
+    columns = [r['name'] for r in c.fetchall()]
+    if 'start_time' not in columns:
+        return
+    select = []
+    for col in columns:
+        if col in LEGACY_TIME_COLUMNS:
+            select.append(f"CASE WHEN NULLIF({col}, '') IS NULL THEN NULL "
+                          f"ELSE CAST(substr({col}, 12, 2) AS INTEGER) * 60 + CAST(substr({col}, 15, 2) AS INTEGER) END")
+        else:
+            select.append(col)
+    new_cols = [LEGACY_TIME_COLUMNS.get(col, col) for col in columns]
+    # 旧テーブルに付いているトリガー・索引はテーブルと一緒に消え、この後作り直される
+    c.execute(f"CREATE TABLE attendance_migrating {ATTENDANCE_SCHEMA}")
+    c.execute(f"INSERT INTO attendance_migrating ({', '.join(new_cols)}) SELECT {', '.join(select)} FROM attendance")
+    c.execute("DROP TABLE attendance")
+    c.execute("ALTER TABLE attendance_migrating RENAME TO attendance")
+
+def create_indexes(c):
+    # 既存の attendance.db にも後から追加できるよう IF NOT EXISTS で作る
+    # (user_id, date) は主キーで引けるので、全員分を日付で引くための索引だけを足す
+    c.execute("CREATE INDEX IF NOT EXISTS idx_attendance_date_user ON attendance (date, user_id)")
 
 # --- 打刻・データ操作 ---
 
+# 出勤・退勤はそれぞれ1文の UPSERT で記録する（確認してから書く間に他の打刻が割り込まない）
+CLOCK_IN_SQL = """
+    INSERT INTO attendance (user_id, date, start_min, work_tag) VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, date) DO UPDATE SET start_min=excluded.start_min
+    WHERE attendance.start_min IS NULL
+"""
+CLOCK_OUT_SQL = """
+    INSERT INTO attendance (user_id, date, end_min, break_duration) VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, date) DO UPDATE SET end_min=excluded.end_min, break_duration=excluded.break_duration
+"""
+
 def clock_in(user_id, work_tag, start_time=None):
+    """
+    出勤を記録する。すでに出勤時刻があればそのまま（先に押した時刻を残す）
+    記録したら True、記録済みだったら False を返す
+    """
     # 日本時間を取得
     if start_time is None:
         start_time = datetime.now(JST)
-    
-    now_str = start_time.strftime('%Y-%m-%d %H:%M:%S')
-    today_str = start_time.strftime('%Y-%m-%d')
-    
-    conn = get_connection()
-    c = conn.cursor()
-    
-    # 既存の記録があるか確認
-    c.execute("SELECT * FROM attendance WHERE user_id=? AND date=?", (user_id, today_str))
-    if c.fetchone():
-        c.execute("UPDATE attendance SET start_time=COALESCE(start_time, ?) WHERE user_id=? AND date=?", 
-                  (now_str, user_id, today_str))
-    else:
-        c.execute("INSERT INTO attendance (user_id, date, start_time, work_tag) VALUES (?, ?, ?, ?)", 
-                  (user_id, today_str, now_str, work_tag))
-    conn.commit()
-    conn.close()
+    params = _clock_in_params(user_id, work_tag, start_time)
+
+    def run(c):
+        check_writable([params[1]])
+        return c.execute(CLOCK_IN_SQL, params).rowcount > 0
+    return write_with_retry(run)
 
 def clock_out(user_id, end_time=None, break_duration=60):
+    """
+    退勤を記録する。その日の記録がまだ無くても退勤時刻は残す（後から出勤時刻を入力できるように）
+    """
     if end_time is None:
         end_time = datetime.now(JST)
-    
-    end_str = end_time.strftime('%Y-%m-%d %H:%M:%S')
-    today_str = end_time.strftime('%Y-%m-%d')
-    
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("UPDATE attendance SET end_time=?, break_duration=? WHERE user_id=? AND date=?", 
-              (end_str, break_duration, user_id, today_str))
-    conn.commit()
-    conn.close()
+    params = _clock_out_params(user_id, end_time, break_duration)
+
+    def run(c):
+        check_writable([params[1]])
+        c.execute(CLOCK_OUT_SQL, params)
+    write_with_retry(run)
+
+def _clock_in_params(user_id, work_tag, start_time):
+    return (user_id, start_time.strftime('%Y-%m-%d'), worktime.to_minutes(start_time), work_tag)
+
+def _clock_out_params(user_id, end_time, break_duration=60):
+    return (user_id, end_time.strftime('%Y-%m-%d'), worktime.to_minutes(end_time), break_duration)
+
+def record_punches(punches):
+    """
+    まとめて届いた打刻を時刻順に1トランザクションで記録する（端末がオフライン中にためた分など）
+    punches: (user_id, 'in' または 'out', 日時, 勤務区分) の並び
+    打刻ごとに、記録したら True・出勤済みで記録しなかったら False を並べて返す（元の並び順）
+    アーカイブ済みの年の打刻が含まれていれば ValueError（何も記録しない）
+    """
+    punches = list(punches)
+    order = sorted(range(len(punches)), key=lambda i: punches[i][2])
+
+    def run(c):
+        check_writable(p[2].strftime('%Y-%m-%d') for p in punches)
+        results = [None] * len(punches)
+        for i in order:
+            user_id, action, when, work_tag = punches[i]
+            if action == 'in':
+                results[i] = c.execute(CLOCK_IN_SQL, _clock_in_params(user_id, work_tag, when)).rowcount > 0
+            else:
+                results[i] = c.execute(CLOCK_OUT_SQL, _clock_out_params(user_id, when)).rowcount > 0
+        return results
+    return write_with_retry(run)
+
+ATTENDANCE_FIELDS = [
+    'start_min', 'end_min', 'break_duration', 'manual_work_time', 'note',
+    'scheduled_start_min', 'scheduled_end_min', 'scheduled_break_duration',
+    'work_tag', 'leave_type', 'practice_duration'
+]
+TIME_FIELDS = {'start_min', 'end_min', 'scheduled_start_min', 'scheduled_end_min'}
 
 def upsert_attendance_record(user_id, target_date, **kwargs):
-    conn = get_connection()
-    c = conn.cursor()
-    d_str = target_date.isoformat()
-    
-    c.execute("SELECT 1 FROM attendance WHERE user_id=? AND date=?", (user_id, d_str))
-    exists = c.fetchone()
+    upsert_attendance_records(user_id, {target_date: kwargs})
+
+def upsert_attendance_records(user_id, rows, fields=None):
+    """
+    複数日分の勤怠を1トランザクションでまとめて書き込む
+    rows は {日付: {列名: 値}} 。fields を指定するとその列だけを書き換え、それ以外の列は残す
+    *_min の列には datetime や 'HH:MM' も渡せる（分数に直して保存する）
+    """
+    if not rows:
+        return
+    fields = list(fields or ATTENDANCE_FIELDS)
     
-    fields = [
-        'start_time', 'end_time', 'break_duration', 'manual_work_time', 'note',
-        'scheduled_start_time', 'scheduled_end_time', 'scheduled_break_duration',
-        'work_tag', 'leave_type', 'practice_duration'
-    ]
+    params = []
+    for target_date, kwargs in rows.items():
+        values = [user_id, target_date.isoformat()]
+        for f in fields:
+            val = kwargs.get(f)
+            if f in TIME_FIELDS:
+                val = worktime.to_minutes(val)
+            values.append(val)
+        params.append(values)
     
-    values = []
-    for f in fields:
-        val = kwargs.get(f)
-        if isinstance(val, (datetime, date)):
-            val = val.strftime('%Y-%m-%d %H:%M:%S')
-        values.append(val)
-        
-    if exists:
-        set_clause = ", ".join([f"{f}=?" for f in fields])
-        sql = f"UPDATE attendance SET {set_clause} WHERE user_id=? AND date=?"
-        c.execute(sql, values + [user_id, d_str])
-    else:
-        col_str = ", ".join(['user_id', 'date'] + fields)
-        ph_str = ", ".join(['?'] * (2 + len(fields)))
-        c.execute(f"INSERT INTO attendance ({col_str}) VALUES ({ph_str})", [user_id, d_str] + values)
-        
-    conn.commit()
-    conn.close()
+    with transaction() as c:
+        check_writable(rows)
+        c.executemany(_upsert_sql(fields), params)
+
+def _upsert_sql(fields):
+    col_str = ", ".join(['user_id', 'date'] + fields)
+    ph_str = ", ".join(['?'] * (2 + len(fields)))
+    set_clause = ", ".join([f"{f}=excluded.{f}" for f in fields])
+    return (f"INSERT INTO attendance ({col_str}) VALUES ({ph_str}) "
+            f"ON CONFLICT(user_id, date) DO UPDATE SET {set_clause}")
+
+IMPORT_BATCH_SIZE = 20000
+
+def import_attendance_rows(rows, fields, batch_size=IMPORT_BATCH_SIZE):
+    """
+    取り込み用。(user_id, 'YYYY-MM-DD', fields の値...) の並びを batch_size 行ずつのトランザクションで書き込む
+    値はそのまま保存する（時刻は分数に直してから渡す）。fields に無い列は既存の値を残す
+    途中で失敗しても、書き込み済みのバッチは同じ内容で入れ直せる（UPSERT なので重複しない）
+    """
+    sql = _upsert_sql(list(fields))
+    rows = iter(rows)
+    written = 0
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return written
+
+        def run(c):
+            check_writable(r[1] for r in batch)
+            c.executemany(sql, batch)
+        write_with_retry(run)
+        written += len(batch)
 
 # --- 参照系 ---
 
 def get_today_record(user_id):
     today_str = datetime.now(JST).strftime('%Y-%m-%d')
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute("SELECT * FROM attendance WHERE user_id=? AND date=?", (user_id, today_str))
-    row = c.fetchone()
-    conn.close()
+    with read_cursor() as c:
+        c.execute("SELECT * FROM attendance WHERE user_id=? AND date=?", (user_id, today_str))
+        row = c.fetchone()
     
     if row:
         d = dict(row)
-        if d['start_time'] and not d['end_time']:
+        if d['start_min'] is not None and d['end_min'] is None:
             d['status'] = 'working'
-        elif d['start_time'] and d['end_time']:
+        elif d['start_min'] is not None and d['end_min'] is not None:
             d['status'] = 'clocked_out'
         else:
             d['status'] = 'not_started'
         return d
     return None
 
+def month_range(year, month):
+    # その月の [1日, 翌月1日) を返す
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
+
+def get_month_version(user_id, year, month):
+    # その月の記録の書き込み回数（記録が一度も無ければ 0）
+    with read_cursor() as c:
+        c.execute("SELECT version FROM monthly_summary WHERE user_id=? AND year=? AND month=?", (user_id, year, month))
+        row = c.fetchone()
+    return row[0] if row else 0
+
 def get_monthly_records(user_id, year, month):
-    conn = get_connection()
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    month_pfx = f"{year}-{month:02d}%"
-    c.execute("SELECT * FROM attendance WHERE user_id=? AND date LIKE ?", (user_id, month_pfx))
-    rows = c.fetchall()
-    conn.close()
-    
+    # version を先に読むので、書き込みと重なっても古い記録が新しい version で残ることはない
+    key = (user_id, year, month, get_month_version(user_id, year, month))
+    records = cache.monthly_records.get_or_compute(key, lambda: _load_monthly_records(user_id, year, month))
+    return {day: dict(r) for day, r in records.items()}
+
+def _load_monthly_records(user_id, year, month):
     results = {}
+    for r in get_records_between(user_id, *month_range(year, month)):
+        day = int(r['date'].split('-')[2])
+        results[day] = r
+    return results
+
+def get_records_between(user_id, start, end):
+    # start <= date < end の記録を日付順に返す（主キー (user_id, date) の範囲検索になる）
+    source = _attendance_source(start, end)
+    with read_cursor() as c:
+        c.execute(f"SELECT * FROM {source} WHERE user_id=? AND date >= ? AND date < ? ORDER BY date",
+                  (user_id, str(start), str(end)))
+        return [dict(r) for r in c.fetchall()]
+
+def get_users(departments=None):
+    # メンバーの一覧（部署順）。departments を指定するとその部署だけ
+    sql = "SELECT id, username, department, role FROM users"
+    params = []
+    if departments is not None:
+        departments = list(departments)
+        sql += f" WHERE department IN ({', '.join(['?'] * len(departments))})"
+        params = departments
+    with read_cursor() as c:
+        return [dict(r) for r in c.execute(sql + " ORDER BY department, id", params)]
+
+EXPORT_CHUNK_SIZE = 1000
+
+def iter_records_between(user_ids, start, end, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    メンバーごと・日付順に start <= date < end の記録を chunk_size 件ずつのリストで返すジェネレーター
+    主キー (user_id, date) の範囲検索をメンバーごとに行うので並べ替えは起きず、
+    期間が何年でも一度に持つのは chunk_size 件だけ
+    """
+    source = _attendance_source(start, end)
+    for user_id in user_ids:
+        with read_cursor() as c:
+            c.execute(f"SELECT * FROM {source} WHERE user_id=? AND date >= ? AND date < ? ORDER BY date",
+                      (user_id, str(start), str(end)))
+            while True:
+                rows = c.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [dict(r) for r in rows]
+
+def get_record_dates(start, end, user_id=None):
+    # start <= date < end の範囲にある (user_id, 日付文字列) の集合
+    sql = f"SELECT user_id, date FROM {_attendance_source(start, end)} WHERE date >= ? AND date < ?"
+    params = [str(start), str(end)]
+    if user_id is not None:
+        sql += " AND user_id=?"
+        params.append(user_id)
+    with read_cursor() as c:
+        c.execute(sql, params)
+        return {(r[0], r[1]) for r in c.fetchall()}
+
+# --- 集計系 ---
+
+def _day_minutes_exprs(t):
+    """
+    attendance の1行（別名 t）から1日分の予定・実績の分数を求める式
+    worktime.compute() と同じ規則（予定休憩は0や未入力なら60分、実績休憩は未入力なら60分、打刻が無ければ手入力の時間）
+    """
+    has_plan = f"({t}.scheduled_start_min IS NOT NULL AND {t}.scheduled_end_min IS NOT NULL)"
+    has_actual = f"({t}.start_min IS NOT NULL AND {t}.end_min IS NOT NULL)"
+    plan_break = f"COALESCE(NULLIF({t}.scheduled_break_duration, 0), {worktime.DEFAULT_BREAK})"
+    actual_break = f"COALESCE({t}.break_duration, {worktime.DEFAULT_BREAK})"
+    return {
+        'plan_break': f"(CASE WHEN {has_plan} THEN {plan_break} ELSE 0 END)",
+        'plan_work': (f"(CASE WHEN {has_plan} THEN MAX(0, {t}.scheduled_end_min - {t}.scheduled_start_min - {plan_break})"
+                      f" ELSE 0 END)"),
+        'actual_break': f"(CASE WHEN {has_actual} THEN {actual_break} ELSE 0 END)",
+        'actual_work': (f"(CASE WHEN {has_actual} THEN MAX(0, {t}.end_min - {t}.start_min - {actual_break})"
+                        f" ELSE COALESCE({t}.manual_work_time, 0) END)"),
+    }
+
+def _day_minutes_sql(source='attendance'):
+    exprs = _day_minutes_exprs('a')
+    cols = ", ".join(f"{v} AS {k}" for k, v in exprs.items())
+    return f"SELECT a.user_id, a.date, a.leave_type, {cols} FROM {source} a WHERE a.date >= ? AND a.date < ?"
+
+def get_rollup(start, end, leave_types=()):
+    """
+    start <= date < end の期間をメンバーごとに1回の集計クエリでまとめる（時間はすべて分）
+    leave_types に渡した休暇種類ごとの日数は leave_counts に入る
+    """
+    leave_types = [lt for lt in leave_types if lt]
+    leave_cols = "".join(f", SUM(d.leave_type = ?) AS leave_{i}" for i in range(len(leave_types)))
+    sql = f"""
+        SELECT u.id AS user_id, u.username, u.department,
+               COUNT(d.user_id) AS record_days,
+               SUM(d.plan_work > 0) AS plan_days,
+               SUM(d.actual_work > 0) AS work_days,
+               SUM(d.plan_work) AS plan_work, SUM(d.plan_break) AS plan_break,
+               SUM(d.actual_work) AS actual_work, SUM(d.actual_break) AS actual_break,
+               SUM(MAX(0, d.actual_work - d.plan_work)) AS overtime
+               {leave_cols}
+        FROM users u LEFT JOIN ({_day_minutes_sql(_attendance_source(start, end))}) d ON d.user_id = u.id
+        GROUP BY u.id
+        ORDER BY u.department, u.id
+    """
+    with read_cursor() as c:
+        c.execute(sql, leave_types + [str(start), str(end)])
+        rows = c.fetchall()
+    
+    results = []
     for r in rows:
-        d_str = r['date']
-        day = int(d_str.split('-')[2])
-        results[day] = dict(r)
+        d = {k: r[k] for k in r.keys() if not k.startswith('leave_')}
+        for k in ('plan_days', 'work_days', 'plan_work', 'plan_break', 'actual_work', 'actual_break', 'overtime'):
+            d[k] = d[k] or 0
+        d['leave_counts'] = {lt: r[f'leave_{i}'] or 0 for i, lt in enumerate(leave_types)}
+        results.append(d)
     return results
 
+# --- 月次サマリー ---
+# monthly_summary は attendance のトリガーで差分更新する。書き込み側の関数は意識しなくてよい
+# version はその月の記録が書き換わるたびに増える（キャッシュの鍵に使う。別プロセスからの書き込みでも増える）
+
+SUMMARY_FIELDS = ['record_days', 'plan_days', 'work_days', 'plan_work', 'plan_break',
+                  'actual_work', 'actual_break', 'overtime']
+
+def _summary_values_exprs(t):
+    # attendance の1行（別名 t）が monthly_summary の各列に足し込む値
+    e = _day_minutes_exprs(t)
+    return {
+        'record_days': "1",
+        'plan_days': f"({e['plan_work']} > 0)",
+        'work_days': f"({e['actual_work']} > 0)",
+        'plan_work': e['plan_work'],
+        'plan_break': e['plan_break'],
+        'actual_work': e['actual_work'],
+        'actual_break': e['actual_break'],
+        'overtime': f"MAX(0, {e['actual_work']} - {e['plan_work']})",
+    }
+
+def _summary_delta_sql(t, sign):
+    # 1行分を足す（sign='+'）または引く（sign='-'）UPSERT文
+    vals = _summary_values_exprs(t)
+    cols = ", ".join(SUMMARY_FIELDS)
+    exprs = ", ".join(f"{sign}{vals[f]}" for f in SUMMARY_FIELDS)
+    sets = ", ".join(f"{f} = {f} + excluded.{f}" for f in SUMMARY_FIELDS)
+    return (f"INSERT INTO monthly_summary (user_id, year, month, {cols}, version) "
+            f"VALUES ({t}.user_id, CAST(substr({t}.date, 1, 4) AS INTEGER), CAST(substr({t}.date, 6, 2) AS INTEGER), {exprs}, 1) "
+            f"ON CONFLICT(user_id, year, month) DO UPDATE SET {sets}, version = version + 1;")
+
+SUMMARY_TRIGGERS = {
+    'trg_attendance_summary_insert': ('AFTER INSERT', lambda: _summary_delta_sql('NEW', '+')),
+    'trg_attendance_summary_delete': ('AFTER DELETE', lambda: _summary_delta_sql('OLD', '-')),
+    'trg_attendance_summary_update': ('AFTER UPDATE', lambda: _summary_delta_sql('OLD', '-') + " " + _summary_delta_sql('NEW', '+')),
+}
+
+def create_summary_table(c):
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='monthly_summary'")
+    exists = c.fetchone()
+    cols = ", ".join(f"{f} INTEGER NOT NULL DEFAULT 0" for f in SUMMARY_FIELDS)
+    c.execute(f"""CREATE TABLE IF NOT EXISTS monthly_summary
+                  (user_id TEXT, year INTEGER, month INTEGER, {cols},
+                   version INTEGER NOT NULL DEFAULT 0,
+                   PRIMARY KEY (user_id, year, month))""")
+    c.execute("PRAGMA table_info(monthly_summary)")
+    if 'version' not in [r['name'] for r in c.fetchall()]:
+        # version 列が無い古いサマリーには列を足し、トリガーも version を増やすものに作り直す
+        c.execute("ALTER TABLE monthly_summary ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        for name in SUMMARY_TRIGGERS:
+            c.execute(f"DROP TRIGGER IF EXISTS {name}")
+    for name, (timing, body) in SUMMARY_TRIGGERS.items():
+        c.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {timing} ON attendance BEGIN {body()} END")
+    if not exists:
+        # 既存のデータベースに後から追加した場合は、今ある記録から作り直す
+        _rebuild_monthly_summary(c)
+
+def _summary_from_attendance_sql(source='attendance'):
+    vals = _summary_values_exprs('a')
+    cols = ", ".join(f"SUM({vals[f]}) AS {f}" for f in SUMMARY_FIELDS)
+    return (f"SELECT a.user_id, CAST(substr(a.date, 1, 4) AS INTEGER) AS year, CAST(substr(a.date, 6, 2) AS INTEGER) AS month, {cols} "
+            f"FROM {source} a GROUP BY a.user_id, year, month")
+
+def rebuild_monthly_summary():
+    """
+    attendance から monthly_summary を全件作り直す。version は戻さず必ず増やす（古いキャッシュを使わせない）
+    アーカイブ済みの年は記録が動かないので、そのまま残す
+    """
+    archived = list(get_archived_years())
+    with transaction() as c:
+        return _rebuild_monthly_summary(c, archived)
+
+def _rebuild_monthly_summary(c, keep_years=()):
+    # keep_years の年の行はそのまま残す（移行の途中では archives 表がまだ無いので、年は呼び出し側が渡す）
+    zero = ", ".join(f"{f} = 0" for f in SUMMARY_FIELDS)
+    sets = ", ".join(f"{f} = excluded.{f}" for f in SUMMARY_FIELDS)
+    keep = ", ".join(str(int(y)) for y in keep_years)
+    c.execute(f"UPDATE monthly_summary SET {zero}, version = version + 1 WHERE year NOT IN ({keep})")
+    c.execute(f"INSERT INTO monthly_summary (user_id, year, month, {', '.join(SUMMARY_FIELDS)}, version) "
+              f"SELECT *, 1 FROM ({_summary_from_attendance_sql()}) WHERE true "
+              f"ON CONFLICT(user_id, year, month) DO UPDATE SET {sets}")
+    return c.rowcount
+
+def verify_monthly_summary():
+    """
+    attendance から集計し直した値と monthly_summary を比べ、食い違う (user_id, year, month) を返す
+    戻り値は [{'user_id':..., 'year':..., 'month':..., 'field':..., 'expected':..., 'stored':...}, ...]
+    """
+    expected, stored = {}, {}
+    archived = get_archived_years()
+    # アーカイブ済みの年は1年ずつ ATTACH してすぐに集計する
+    # （先にまとめて ATTACH すると、MAX_ATTACHED を超えたところで前の年が DETACH される）
+    for year in [None] + sorted(archived):
+        source = 'attendance' if year is None else f"{_attach_archive(year, archived[year])}.attendance"
+        with read_cursor() as c:
+            for r in c.execute(_summary_from_attendance_sql(source)):
+                expected[(r['user_id'], r['year'], r['month'])] = r
+    with read_cursor() as c:
+        for r in c.execute("SELECT * FROM monthly_summary"):
+            stored[(r['user_id'], r['year'], r['month'])] = r
+    
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        e, s = expected.get(key), stored.get(key)
+        for f in SUMMARY_FIELDS:
+            e_val = e[f] if e else 0
+            s_val = s[f] if s else 0
+            if e_val != s_val:
+                drift.append({'user_id': key[0], 'year': key[1], 'month': key[2],
+                              'field': f, 'expected': e_val, 'stored': s_val})
+    return drift
+
+def get_monthly_summary(user_id, year, month):
+    with read_cursor() as c:
+        c.execute("SELECT * FROM monthly_summary WHERE user_id=? AND year=? AND month=?", (user_id, year, month))
+        row = c.fetchone()
+    if row:
+        return dict(row)
+    return dict(user_id=user_id, year=year, month=month, **{f: 0 for f in SUMMARY_FIELDS})
+
+def get_ytd_summaries(year):
+    """
+    その年の月次サマリーに1月からの累計（ウィンドウ関数）を付け、メンバー・月の順で返す（時間は分）
+    日ごとの記録は読まない。記録の無い月の行は無い
+    """
+    sql = """
+        SELECT user_id, month, plan_days, work_days, plan_work, actual_work,
+               SUM(plan_days) OVER w AS ytd_plan_days, SUM(work_days) OVER w AS ytd_work_days,
+               SUM(plan_work) OVER w AS ytd_plan_work, SUM(actual_work) OVER w AS ytd_actual_work
+        FROM monthly_summary WHERE year=?
+        WINDOW w AS (PARTITION BY user_id ORDER BY month)
+        ORDER BY user_id, month
+    """
+    with read_cursor() as c:
+        return [dict(r) for r in c.execute(sql, (year,))]
+
 def get_annual_plans(year):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("SELECT username, annual_hours FROM annual_plans WHERE year=?", (year,))
-    rows = c.fetchall()
-    conn.close()
+    with read_cursor() as c:
+        c.execute("SELECT username, annual_hours FROM annual_plans WHERE year=?", (year,))
+        rows = c.fetchall()
     return {r[0]: r[1] for r in rows}
 
 def set_annual_plan(username, year, hours):
+    with transaction() as c:
+        c.execute("INSERT OR REPLACE INTO annual_plans (username, year, annual_hours) VALUES (?, ?, ?)", 
+                  (username, year, hours))
+
+# --- 休暇台帳 ---
+# 休暇の取得は attendance の leave_type（1行 = 1日）、付与と繰越は leave_grants に記録する
+# 振替休暇は付与の記録を持たず、休日勤務の日数をそのまま付与とみなす
+
+LEAVE_LEDGER_TYPES = ['有給休暇', '振替休暇', '特別休暇']
+HOLIDAY_WORK = '休日勤務'
+SUBSTITUTE_LEAVE = '振替休暇'
+
+def create_leave_tables(c):
+    create_leave_index(c)
+    c.execute("""CREATE TABLE IF NOT EXISTS leave_grants
+                 (id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, leave_type TEXT NOT NULL, grant_date TEXT NOT NULL,
+                  days REAL NOT NULL, kind TEXT NOT NULL DEFAULT 'grant', note TEXT)""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_leave_grants ON leave_grants (user_id, leave_type, grant_date)")
+
+def create_leave_index(c, schema='main'):
+    # 休暇の種類ごとに日付で引く索引。ほとんどの日は leave_type が NULL なので、その行は索引に入れない
+    # （leave_type = ? / IN (...) の条件は NULL でないことを含むので、この索引を使える）
+    c.execute(f"CREATE INDEX IF NOT EXISTS {schema}.idx_attendance_leave "
+              f"ON attendance (user_id, leave_type, date) WHERE leave_type IS NOT NULL")
+
+def clear_empty_text(c):
+    # 以前の編集モードは空の種類・備考を '' で保存していた。NULL に直し、休暇の索引から外す
+    for col in ('leave_type', 'note'):
+        c.execute(f"UPDATE attendance SET {col} = NULL WHERE TRIM({col}) = ''")
+
+def add_leave_grant(user_id, leave_type, grant_date, days, kind='grant', note=None):
+    # kind は 'grant'（付与）か 'carryover'（繰越）
+    with transaction() as c:
+        c.execute("INSERT INTO leave_grants (user_id, leave_type, grant_date, days, kind, note) VALUES (?, ?, ?, ?, ?, ?)",
+                  (user_id, leave_type, str(grant_date), days, kind, note))
+        return c.lastrowid
+
+def delete_leave_grant(grant_id):
+    with transaction() as c:
+        c.execute("DELETE FROM leave_grants WHERE id=?", (grant_id,))
+
+def replace_leave_carryovers(leave_type, grant_date, rows):
+    """
+    grant_date 付けの leave_type の繰越を rows で置き換える（同じ年の繰越を何度計算し直しても重ならない）
+    rows: (user_id, 日数, 備考) の並び
+    """
+    with transaction() as c:
+        c.execute("DELETE FROM leave_grants WHERE kind='carryover' AND leave_type=? AND grant_date=?",
+                  (leave_type, str(grant_date)))
+        c.executemany("INSERT INTO leave_grants (user_id, leave_type, grant_date, days, kind, note) "
+                      "VALUES (?, ?, ?, ?, 'carryover', ?)",
+                      [(uid, leave_type, str(grant_date), days, note) for uid, days, note in rows])
+
+def get_leave_grants(start, end, user_id=None):
+    # start <= grant_date < end の付与・繰越を日付順に返す
+    sql = "SELECT * FROM leave_grants WHERE grant_date >= ? AND grant_date < ?"
+    params = [str(start), str(end)]
+    if user_id is not None:
+        sql += " AND user_id=?"
+        params.append(user_id)
+    with read_cursor() as c:
+        return [dict(r) for r in c.execute(sql + " ORDER BY grant_date, user_id, id", params)]
+
+def _leave_days_sql(start, end, leave_types, user_ids=None):
+    """
+    start <= date < end で leave_types のいずれかの日の (user_id, leave_type, date) を読む SELECT と、その引数
+    本体は休暇の索引を INDEXED BY で使う（統計が無いと日付の索引が選ばれ、全員分の集計で1年分を読んでしまう）
+    アーカイブ済みの年は、そのアーカイブからも同じ条件で読んで UNION ALL でつなぐ（古いアーカイブには索引が無い）
+    """
+    where = f"leave_type IN ({', '.join(['?'] * len(leave_types))}) AND date >= ? AND date < ?"
+    params = list(leave_types) + [str(start), str(end)]
+    if user_ids is not None:
+        where += f" AND user_id IN ({', '.join(['?'] * len(user_ids))})"
+        params += list(user_ids)
+    tables = ["main.attendance INDEXED BY idx_attendance_leave"]
+    tables += [f"{schema}.attendance" for schema in _archive_schemas(start, end)]
+    sql = " UNION ALL ".join(f"SELECT user_id, leave_type, date FROM {t} WHERE {where}" for t in tables)
+    return sql, params * len(tables)
+
+def get_leave_days(start, end, leave_types, user_ids=None):
+    # start <= date < end で leave_types のいずれかの日を (user_id, leave_type, date) の順に返す
+    sql, params = _leave_days_sql(start, end, list(leave_types), user_ids if user_ids is None else list(user_ids))
+    with read_cursor() as c:
+        return [dict(r) for r in c.execute(f"SELECT * FROM ({sql}) ORDER BY user_id, leave_type, date", params)]
+
+def get_leave_balances(start, end, leave_types=LEAVE_LEDGER_TYPES, user_ids=None):
+    """
+    start <= 日付 < end の休暇の付与・繰越・取得と残りを、メンバー × 休暇の種類ごとに1回の問い合わせで返す
+    戻り値は [{'user_id', 'username', 'department', 'leave_type', 'granted', 'carried', 'used', 'balance'}, ...]
+    （部署・メンバー順、同じメンバーの中は leave_types の順）。振替休暇の granted は休日勤務の日数
+    """
+    leave_types = list(leave_types)
+    types_sql = " UNION ALL ".join(f"SELECT {i} AS i, ? AS leave_type" for i in range(len(leave_types)))
+    counted = leave_types + [HOLIDAY_WORK]
+    user_filter, user_where, user_params = "", "", []
+    if user_ids is not None:
+        user_params = list(user_ids)
+        in_list = ", ".join(['?'] * len(user_params))
+        user_filter, user_where = f" AND user_id IN ({in_list})", f"WHERE u.id IN ({in_list})"
+    days_sql, days_params = _leave_days_sql(start, end, counted, user_ids if user_ids is None else user_params)
+    sql = f"""
+        WITH types AS ({types_sql}),
+        used AS (
+            SELECT user_id, leave_type, COUNT(*) AS days FROM ({days_sql})
+            GROUP BY user_id, leave_type),
+        ledger AS (
+            SELECT user_id, leave_type, TOTAL(days) FILTER (WHERE kind = 'grant') AS granted,
+                   TOTAL(days) FILTER (WHERE kind = 'carryover') AS carried
+            FROM leave_grants WHERE grant_date >= ? AND grant_date < ?{user_filter}
+            GROUP BY user_id, leave_type)
+        SELECT u.id AS user_id, u.username, u.department, t.leave_type,
+               COALESCE(l.granted, 0) + COALESCE(w.days, 0) AS granted,
+               COALESCE(l.carried, 0) AS carried, COALESCE(d.days, 0) AS used
+        FROM users u CROSS JOIN types t
+        LEFT JOIN ledger l ON l.user_id = u.id AND l.leave_type = t.leave_type
+        LEFT JOIN used d ON d.user_id = u.id AND d.leave_type = t.leave_type
+        LEFT JOIN used w ON w.user_id = u.id AND t.leave_type = ? AND w.leave_type = ?
+        {user_where}
+        ORDER BY u.department, u.id, t.i
+    """
+    params = (leave_types + days_params + [str(start), str(end)] + user_params
+              + [SUBSTITUTE_LEAVE, HOLIDAY_WORK] + user_params)
+    with read_cursor() as c:
+        rows = [dict(r) for r in c.execute(sql, params)]
+    for r in rows:
+        r['balance'] = r['granted'] + r['carried'] - r['used']
+    return rows
+
+# --- 年ごとのアーカイブ ---
+# 締めた年の記録を archive/attendance_<年>.db へ移し、本体の attendance.db を小さく保つ
+# アーカイブは読み取り専用で ATTACH し、期間を指定する参照（勤怠表・集計・書き出し）では本体の記録と合わせて読む
+# 月次サマリー（と version）は本体に残すので、ダッシュボードや年間計画、キャッシュの鍵はそのまま使える
+
+ARCHIVE_DIR = 'archive'
+MAX_ATTACHED = 8  # 同時に ATTACH するアーカイブの上限（SQLite の既定の上限は10）
+ARCHIVE_COLUMNS = ", ".join(['user_id', 'date'] + ATTENDANCE_FIELDS)
+
+def create_archive_table(c):
+    c.execute("""CREATE TABLE IF NOT EXISTS archives
+                 (year INTEGER PRIMARY KEY, path TEXT NOT NULL, rows INTEGER NOT NULL, archived_at TEXT NOT NULL)""")
+
+def _db_dir():
+    return os.path.dirname(os.path.abspath(DB_NAME))
+
+def archive_path(year):
+    # 本体のデータベースからの相対パス
+    return os.path.join(ARCHIVE_DIR, f"attendance_{year}.db")
+
+def get_archived_years():
+    # {年: アーカイブの絶対パス}
+    with read_cursor() as c:
+        return {r[0]: os.path.join(_db_dir(), r[1]) for r in c.execute("SELECT year, path FROM archives")}
+
+def get_archives():
+    with read_cursor() as c:
+        return [dict(r) for r in c.execute("SELECT * FROM archives ORDER BY year")]
+
+def is_archived_year(year):
+    return year in get_archived_years()
+
+def check_writable(dates):
+    # アーカイブ済みの年の日付が含まれていれば ValueError（本体に書くと記録が二重になるため）
+    # 書き込みのトランザクションの中で呼ぶ（確かめてから書くまでの間に archive_year が割り込まないように）
+    archived = get_archived_years()
+    if not archived:
+        return
+    years = {int(str(d)[:4]) for d in dates} & set(archived)
+    if years:
+        raise ValueError(f"{min(years)}年はアーカイブ済みのため変更できません")
+
+def _attach_archive(year, path):
+    # この接続にアーカイブを読み取り専用で ATTACH し、スキーマ名を返す
+    attached = _local.attached
+    if year in attached:
+        return attached[year]
     conn = get_connection()
-    c = conn.cursor()
-    c.execute("INSERT OR REPLACE INTO annual_plans (username, year, annual_hours) VALUES (?, ?, ?)", 
-              (username, year, hours))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    if conn.in_transaction:
+        raise RuntimeError("トランザクションの中ではアーカイブを参照できません")
+    if len(attached) >= MAX_ATTACHED:
+        for schema in attached.values():
+            conn.execute(f"DETACH DATABASE {schema}")
+        attached.clear()
+    schema = f"archive_{year}"
+    conn.execute(f"ATTACH DATABASE ? AS {schema}", (pathlib.Path(path).as_uri() + "?mode=ro",))
+    attached[year] = schema
+    return schema
+
+def _attendance_source(start, end):
+    """
+    start <= date < end を読むときの FROM に置く表。アーカイブ済みの年が重なっていなければ attendance のまま
+    重なっていれば、その年のアーカイブを ATTACH して本体と UNION ALL でつなぐ
+    """
+    schemas = _archive_schemas(start, end)
+    if not schemas:
+        return "attendance"
+    parts = [f"SELECT {ARCHIVE_COLUMNS} FROM main.attendance"]
+    parts += [f"SELECT {ARCHIVE_COLUMNS} FROM {schema}.attendance" for schema in schemas]
+    return "(" + " UNION ALL ".join(parts) + ")"
+
+def _archive_schemas(start, end):
+    # start <= date < end に重なるアーカイブ済みの年を ATTACH し、そのスキーマ名を年の順に返す
+    start, end = str(start), str(end)
+    archived = get_archived_years()
+    years = [y for y in sorted(archived) if f"{y}-01-01" < end and f"{y + 1}-01-01" > start]
+    if len(years) > MAX_ATTACHED:
+        raise ValueError(f"アーカイブ済みの年は一度に{MAX_ATTACHED}年分まで参照できます")
+    return [_attach_archive(y, archived[y]) for y in years]
+
+def _attendance_stats(c, source, start, end):
+    # 件数、各列の合計（文字の列は件数）と、月次サマリーの列に当たる合計（移す前後で比べる）
+    vals = _summary_values_exprs('a')
+    exprs = {f: f"TOTAL(a.{f})" for f in ATTENDANCE_FIELDS}
+    exprs.update({f: f"COUNT(a.{f})" for f in ('leave_type', 'note', 'work_tag')})
+    exprs.update({f"summary_{f}": f"TOTAL({vals[f]})" for f in SUMMARY_FIELDS})
+    cols = ", ".join(f"{e} AS {k}" for k, e in exprs.items())
+    row = c.execute(f"SELECT COUNT(*) AS rows, {cols} FROM {source} a WHERE a.date >= ? AND a.date < ?",
+                    (start, end)).fetchone()
+    return dict(row)
+
+def _summary_stats(c, year):
+    # 月次サマリーの1年分の合計（キーは _attendance_stats と同じ summary_<列>）
+    cols = ", ".join(f"TOTAL({f}) AS summary_{f}" for f in SUMMARY_FIELDS)
+    return dict(c.execute(f"SELECT {cols} FROM monthly_summary WHERE year=?", (year,)).fetchone())
+
+def archive_year(year):
+    """
+    year の記録をアーカイブへ移し、移した行数を返す
+    コピー・確認・本体からの削除・登録を1つのトランザクションで行い、件数や合計が合わなければ何も変えずに中止する
+    削除のトリガーで 0 になる月次サマリーは元の値に戻す（version は増えたまま）
+    """
+    if year >= datetime.now(JST).year:
+        raise ValueError("今年以降の記録はアーカイブできません")
+    if is_archived_year(year):
+        raise ValueError(f"{year}年はアーカイブ済みです")
+    start, end = f"{year}-01-01", f"{year + 1}-01-01"
+    rel_path = archive_path(year)
+    path = os.path.join(_db_dir(), rel_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        # 登録されていないファイルは、前回中断したときの残り
+        os.chmod(path, 0o644)
+        os.remove(path)
+
+    conn = get_connection()
+    conn.execute("ATTACH DATABASE ? AS archive_new", (path,))
+    try:
+        with transaction() as c:
+            before = _attendance_stats(c, "main.attendance", start, end)
+            if before['rows'] == 0:
+                raise ValueError(f"{year}年の記録がありません")
+            summary_before = _summary_stats(c, year)
+            c.execute(f"CREATE TABLE archive_new.attendance {ATTENDANCE_SCHEMA}")
+            create_leave_index(c, 'archive_new')
+            c.execute(f"INSERT INTO archive_new.attendance ({ARCHIVE_COLUMNS}) "
+                      f"SELECT {ARCHIVE_COLUMNS} FROM main.attendance WHERE date >= ? AND date < ?", (start, end))
+            if _attendance_stats(c, "archive_new.attendance", start, end) != before:
+                raise RuntimeError("アーカイブへコピーした記録の件数・合計が一致しません")
+
+            fields = ", ".join(SUMMARY_FIELDS)
+            saved = c.execute(f"SELECT user_id, month, {fields} FROM monthly_summary WHERE year=?", (year,)).fetchall()
+            c.execute("DELETE FROM main.attendance WHERE date >= ? AND date < ?", (start, end))
+            sets = ", ".join(f"{f}=?" for f in SUMMARY_FIELDS)
+            c.executemany(f"UPDATE monthly_summary SET {sets} WHERE user_id=? AND year=? AND month=?",
+                          [tuple(r[f] for f in SUMMARY_FIELDS) + (r['user_id'], year, r['month']) for r in saved])
+            if _summary_stats(c, year) != summary_before:
+                raise RuntimeError("月次サマリーが移す前と一致しません")
+            c.execute("INSERT INTO archives (year, path, rows, archived_at) VALUES (?, ?, ?, ?)",
+                      (year, rel_path, before['rows'], datetime.now(JST).isoformat(timespec='seconds')))
+    except BaseException:
+        conn.execute("DETACH DATABASE archive_new")
+        os.remove(path)
+        raise
+    conn.execute("DETACH DATABASE archive_new")
+    os.chmod(path, 0o444)
+
+    problems = verify_archives([year])
+    if problems:
+        raise RuntimeError("アーカイブ後の確認で食い違いがあります: " + "; ".join(problems))
+    return before['rows']
+
+def verify_archives(years=None):
+    """
+    アーカイブごとに、件数・合計が登録時の件数と月次サマリーに一致し、本体に同じ年の記録が残っていないかを調べる
+    食い違いの説明の一覧を返す（空なら問題なし）
+    """
+    problems = []
+    archived = get_archived_years()
+    registered = {a['year']: a['rows'] for a in get_archives()}
+    for year in sorted(years or archived):
+        start, end = f"{year}-01-01", f"{year + 1}-01-01"
+        if not os.path.exists(archived[year]):
+            problems.append(f"{year}年: ファイルがありません（{archived[year]}）")
+            continue
+        schema = _attach_archive(year, archived[year])
+        with read_cursor() as c:
+            stats = _attendance_stats(c, f"{schema}.attendance", start, end)
+            total = c.execute(f"SELECT COUNT(*) FROM {schema}.attendance").fetchone()[0]
+            hot = c.execute("SELECT COUNT(*) FROM main.attendance WHERE date >= ? AND date < ?", (start, end)).fetchone()[0]
+            summary = _summary_stats(c, year)
+        if stats['rows'] != registered[year] or total != registered[year]:
+            problems.append(f"{year}年: 件数 {total} が登録時の {registered[year]} と違います")
+        if any(stats[k] != v for k, v in summary.items()):
+            problems.append(f"{year}年: 月次サマリーとアーカイブの合計が違います")
+        if hot:
+            problems.append(f"{year}年: 本体にも {hot} 件の記録があります")
+    return problems
+
+def compact():
+    """
+    本体のデータベースを詰める（WAL を書き戻し、VACUUM で空きを返し、統計を取り直す）
+    (前のファイルサイズ, 後のファイルサイズ) を返す
+    """
+    def size():
+        return sum(os.path.getsize(DB_NAME + ext) for ext in ('', '-wal') if os.path.exists(DB_NAME + ext))
+    conn = get_connection()
+    for schema in _local.attached.values():
+        conn.execute(f"DETACH DATABASE {schema}")
+    _local.attached.clear()
+    before = size()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("VACUUM")
+    conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return before, size()
+
+# --- 計測 ---
+# この下までに定義した関数を計測用に包む（接続・トランザクションの管理そのものと、時間を測れないジェネレーターは除く）
+instrument.instrument_module(globals(), 'db',
+                             exclude={'get_connection', 'close_connection', 'transaction', 'read_cursor',
+                                      'iter_records_between'},
+                             include={'_load_user', '_load_monthly_records'})
\ No newline at end of file
@@ -0,0 +1,92 @@
+import csv
+from datetime import date
+import pandas as pd
+import database
+import reports
+import worktime
+
+# Excel 形式の書き出しには openpyxl を使う（無ければ CSV だけ）
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# --- 給与計算用の書き出し ---
+# 記録はメンバーごとに chunk_size 件ずつ読み、その場で計算して1行ずつ書き出す
+# 期間が1か月でも5年でも、手元に持つのは1チャンク分とメンバーごとの合計だけ
+
+WEEKDAYS = ["月", "火", "水", "木", "金", "土", "日"]
+DETAIL_HEADER = ["氏名", "部署", "日付", "曜日", "予定開始", "予定終了", "予定休憩", "予定時間",
+                 "出勤", "退勤", "実績休憩", "実績時間", "超過時間", "種類", "備考"]
+TOTAL_KEYS = ['plan_work', 'plan_break', 'actual_work', 'actual_break', 'overtime']
+TOTAL_HEADER = ["氏名", "部署", "予定日数", "出勤日数"] + [reports.HOUR_COLUMNS[k] for k in TOTAL_KEYS]
+
+def _hours(minutes):
+    return round(float(minutes) / 60, 2)
+
+def _text(val):
+    # DataFrame を通すと空の文字列列は NaN になるので空文字にそろえる
+    return "" if val is None or pd.isna(val) else str(val)
+
+def _detail_rows(user, calc):
+    # 勤怠表と同じ規則で計算した1日1行（時間は時間単位）
+    for r in calc.to_dict('records'):
+        d = date.fromisoformat(r['date'])
+        yield [
+            user['username'], user['department'], r['date'], WEEKDAYS[d.weekday()],
+            worktime.format_minutes(r['plan_start']), worktime.format_minutes(r['plan_end']),
+            _hours(r['plan_break_eff']), _hours(r['plan_work']),
+            worktime.format_minutes(r['start']), worktime.format_minutes(r['end']),
+            _hours(r['actual_break_eff']), _hours(r['actual_work']), _hours(r['overtime']),
+            _text(r.get('leave_type')), _text(r.get('note')),
+        ]
+
+def payroll_rows(start, end, departments=None, chunk_size=database.EXPORT_CHUNK_SIZE):
+    """
+    start <= 日付 < end の記録を ('day', 明細行) と ('total', 合計行) で順に返すジェネレーター
+    メンバーごとに明細のあとにそのメンバーの合計が来る。合計は worktime.totals（勤怠表の合計と同じ計算）を足し合わせたもの
+    """
+    for user in database.get_users(departments):
+        total = None
+        for chunk in database.iter_records_between([user['id']], start, end, chunk_size):
+            calc = worktime.compute(worktime.records_frame(chunk))
+            for row in _detail_rows(user, calc):
+                yield 'day', row
+            t = worktime.totals(calc)
+            total = t if total is None else {k: total[k] + t[k] for k in t}
+        if total is not None:
+            yield 'total', [user['username'], user['department'], total['plan_days'], total['work_days']] + \
+                [_hours(total[k]) for k in TOTAL_KEYS]
+
+def write_csv(f, start, end, departments=None, kind='day'):
+    """
+    テキストのファイル f に CSV で書き出し、書いた行数を返す。kind は 'day'（明細）か 'total'（メンバー別合計）
+    Excel で文字化けしないよう、ファイルは encoding='utf-8-sig', newline='' で開いておく
+    """
+    writer = csv.writer(f)
+    writer.writerow(DETAIL_HEADER if kind == 'day' else TOTAL_HEADER)
+    count = 0
+    for row_kind, row in payroll_rows(start, end, departments):
+        if row_kind == kind:
+            writer.writerow(row)
+            count += 1
+    return count
+
+def write_xlsx(path, start, end, departments=None):
+    """
+    「明細」「合計」の2シートの Excel ファイルを書き出し、明細の行数を返す
+    書き出し専用のブックを使うので、行はすぐにファイル側へ送られメモリには残らない
+    """
+    if openpyxl is None:
+        raise RuntimeError("Excel 形式で書き出すには openpyxl が必要です（pip install openpyxl）")
+    wb = openpyxl.Workbook(write_only=True)
+    sheets = {'day': wb.create_sheet("明細"), 'total': wb.create_sheet("合計")}
+    sheets['day'].append(DETAIL_HEADER)
+    sheets['total'].append(TOTAL_HEADER)
+    count = 0
+    for row_kind, row in payroll_rows(start, end, departments):
+        sheets[row_kind].append(row)
+        if row_kind == 'day':
+            count += 1
+    wb.save(path)
+    return count
\ No newline at end of file
@@ -0,0 +1,194 @@
+import argparse
+import os
+import pandas as pd
+import database
+import worktime
+
+# --- 勤怠データの一括取り込み ---
+# CSV / Excel の過去の勤怠表を attendance に取り込む。検査は列ごとにまとめて行い（行ごとのループはしない）、
+# 正しい行だけを executemany で大きなトランザクションにまとめて書き込む
+# 使い方: python importer.py 勤怠_2019-2024.xlsx --rejects rejects.csv [--dry-run]
+
+# 見出し → (attendance の列, 値の種類)
+#   time: 'HH:MM'（全角も可）または0時からの分数  hours: 時間（分に直す）  minutes: 分  text / date: そのまま
+# 日本語の見出しは給与データの書き出し（export.py の明細）と同じなので、書き出したファイルをそのまま取り込める
+SOURCE_COLUMNS = {
+    '氏名': ('user_id', 'text'), '日付': ('date', 'date'),
+    '予定開始': ('scheduled_start_min', 'time'), '予定終了': ('scheduled_end_min', 'time'),
+    '予定休憩': ('scheduled_break_duration', 'hours'),
+    '出勤': ('start_min', 'time'), '退勤': ('end_min', 'time'), '実績休憩': ('break_duration', 'hours'),
+    '手入力時間': ('manual_work_time', 'hours'), '練習時間': ('practice_duration', 'hours'),
+    '種類': ('leave_type', 'text'), '備考': ('note', 'text'), '勤務区分': ('work_tag', 'text'),
+    # attendance の列名そのまま（時間は分）
+    'user_id': ('user_id', 'text'), 'date': ('date', 'date'),
+    'scheduled_start_min': ('scheduled_start_min', 'time'), 'scheduled_end_min': ('scheduled_end_min', 'time'),
+    'scheduled_break_duration': ('scheduled_break_duration', 'minutes'),
+    'start_min': ('start_min', 'time'), 'end_min': ('end_min', 'time'), 'break_duration': ('break_duration', 'minutes'),
+    'manual_work_time': ('manual_work_time', 'minutes'), 'practice_duration': ('practice_duration', 'minutes'),
+    'leave_type': ('leave_type', 'text'), 'note': ('note', 'text'), 'work_tag': ('work_tag', 'text'),
+}
+# 書き出しファイルの「実績時間」は、出勤・退勤の無い日だけ手入力の時間として取り込む
+ACTUAL_HOURS_COLUMN = '実績時間'
+
+def read_table(f, name=None):
+    """
+    CSV（UTF-8、BOM 付きも可）か Excel（1枚目のシート）を、すべて文字列の DataFrame として読む
+    """
+    name = name or (f if isinstance(f, str) else getattr(f, 'name', ''))
+    if os.path.splitext(name)[1].lower() in ('.xlsx', '.xlsm'):
+        return pd.read_excel(f, sheet_name=0, dtype=str).fillna("")
+    return pd.read_csv(f, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+
+def _by_unique(parse, s):
+    """
+    勤怠表は同じ値（'08:30' や同じ日付）が何度も出てくるので、異なる値ごとに1回だけ parse して行へ配り直す
+    parse は列を受け取り (値の列, 不正の真偽の列) を返す関数
+    """
+    codes, uniques = pd.factorize(s.fillna("").astype(str))
+    values, bad = parse(pd.Series(uniques))
+    return (pd.Series(values.to_numpy()[codes], index=s.index),
+            pd.Series(bad.to_numpy()[codes], index=s.index))
+
+def _parse_times(s):
+    # (分数, 不正の真偽)。Excel の時刻セル（'08:30:00'）の秒は捨てる
+    norm = worktime.normalize_series(s).str.replace(r'^(\d{1,2}:\d{1,2}):\d{2}$', r'\1', regex=True)
+    digits = norm.str.fullmatch(r'\d+')
+    minutes, bad = worktime.parse_hhmm_series(norm.where(~digits, ""))
+    minutes = minutes.where(~digits, pd.to_numeric(norm.where(digits), errors='coerce'))
+    return minutes, bad | (digits & (minutes >= 24 * 60))
+
+def _parse_numbers(s, scale):
+    norm = worktime.normalize_series(s)
+    num = pd.to_numeric(norm, errors='coerce')
+    bad = (norm != "") & (num.isna() | (num < 0))
+    return (num * scale).round().where(~bad), bad
+
+def _parse_dates(s):
+    norm = worktime.normalize_series(s).str.replace(r'[/.]', '-', regex=True).str.extract(r'^(\d{4}-\d{1,2}-\d{1,2})')[0]
+    d = pd.to_datetime(norm, format='%Y-%m-%d', errors='coerce')
+    return d.dt.strftime('%Y-%m-%d'), d.isna()
+
+def _lookup_users(s, user_ids):
+    ids = worktime.normalize_series(s).map(user_ids)
+    return ids, ids.isna()
+
+def validate(df, users=None):
+    """
+    読み込んだ表を検査し、(取り込む DataFrame（attendance の列）, 書き込む列, 除外した行の DataFrame) を返す
+    除外した行には元の行番号（見出しを1行目とした番号）と理由が付く
+    """
+    headers = {h: SOURCE_COLUMNS[h] for h in df.columns if h in SOURCE_COLUMNS}
+    targets = {col for col, _ in headers.values()}
+    if not {'user_id', 'date'} <= targets:
+        raise ValueError("「氏名」と「日付」の列が必要です")
+    if users is None:
+        users = database.get_users()
+    # 氏名はユーザー名でも user_id でもよい
+    user_ids = {u['username']: u['id'] for u in users}
+    user_ids.update({u['id']: u['id'] for u in users})
+
+    # 空行は数えずに飛ばす
+    df = df.fillna("")
+    df = df[(df.astype(str).apply(lambda col: col.str.strip()) != "").any(axis=1)]
+    out = pd.DataFrame(index=df.index)
+    reasons = pd.Series("", index=df.index)
+
+    def reject(mask, label):
+        nonlocal reasons
+        reasons = reasons.where(~mask, reasons + label + "。")
+
+    for header, (col, kind) in headers.items():
+        if col in out:
+            continue
+        s = df[header]
+        if kind == 'text' and col == 'user_id':
+            out[col], bad = _by_unique(lambda u: _lookup_users(u, user_ids), s)
+            reject(bad, f"{header}が登録されていません")
+        elif kind == 'text':
+            text = s.fillna("").astype(str).str.strip()
+            out[col] = text.where(text != "")
+        elif kind == 'date':
+            out[col], bad = _by_unique(_parse_dates, s)
+            reject(bad, f"{header}が正しくありません")
+        elif kind == 'time':
+            out[col], bad = _by_unique(_parse_times, s)
+            reject(bad, f"{header}は HH:MM で入力してください")
+        else:
+            scale = 60 if kind == 'hours' else 1
+            out[col], bad = _by_unique(lambda u: _parse_numbers(u, scale), s)
+            reject(bad, f"{header}は0以上の数で入力してください")
+
+    if ACTUAL_HOURS_COLUMN in df.columns and 'manual_work_time' not in out:
+        hours, bad = _by_unique(lambda u: _parse_numbers(u, 60), df[ACTUAL_HOURS_COLUMN])
+        no_punch = out.get('start_min', pd.Series(float('nan'), index=df.index)).isna() & \
+            out.get('end_min', pd.Series(float('nan'), index=df.index)).isna()
+        out['manual_work_time'] = hours.where(no_punch & (hours > 0))
+        reject(bad, f"{ACTUAL_HOURS_COLUMN}は0以上の数で入力してください")
+
+    for s_col, e_col, label in (('start_min', 'end_min', "退勤が出勤より前です"),
+                                ('scheduled_start_min', 'scheduled_end_min', "予定終了が予定開始より前です")):
+        if s_col in out and e_col in out:
+            reject(out[e_col] < out[s_col], label)
+    archived = database.get_archived_years()
+    if archived:
+        years = pd.to_numeric(out['date'].str[:4], errors='coerce')
+        reject(years.isin(list(archived)), "アーカイブ済みの年の記録は変更できません")
+    # 同じ人・同じ日が複数あるときは、ほかの理由で除外されなかった行のうち最後の行を使う
+    valid = reasons == ""
+    reject(out[valid].duplicated(['user_id', 'date'], keep='last').reindex(out.index, fill_value=False),
+           "同じ日の行が後にもあります")
+
+    bad = reasons != ""
+    rejected = df[bad].copy()
+    rejected.insert(0, '理由', reasons[bad])
+    rejected.insert(0, '行', rejected.index + 2)
+    fields = [c for c in database.ATTENDANCE_FIELDS if c in out]
+    return out[~bad][['user_id', 'date'] + fields], fields, rejected
+
+def _params(good, fields):
+    # 分数は整数に、空は None にして (user_id, date, 値...) の並びにする
+    cols = good.copy()
+    for col in fields:
+        if pd.api.types.is_float_dtype(cols[col]):
+            cols[col] = cols[col].astype('Int64')
+    cols = cols.astype(object)
+    return cols.where(cols.notna(), None).itertuples(index=False, name=None)
+
+def import_table(df, dry_run=False):
+    """
+    検査して正しい行を書き込む。{'rows', 'loaded', 'fields', 'rejected'} を返す（dry_run なら書き込まない）
+    """
+    good, fields, rejected = validate(df)
+    loaded = 0
+    if not dry_run and len(good):
+        loaded = database.import_attendance_rows(_params(good, fields), fields)
+    return {'rows': len(good) + len(rejected), 'loaded': loaded, 'fields': fields, 'rejected': rejected}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="勤怠データ（CSV / Excel）の一括取り込み")
+    parser.add_argument('file', help="取り込むファイル（.csv / .xlsx）")
+    parser.add_argument('--db', default=database.DB_NAME, help="データベースファイル")
+    parser.add_argument('--rejects', help="取り込まなかった行を書き出す CSV")
+    parser.add_argument('--dry-run', action='store_true', help="検査だけして書き込まない")
+    args = parser.parse_args(argv)
+    database.DB_NAME = args.db
+    database.create_tables()
+
+    try:
+        result = import_table(read_table(args.file), dry_run=args.dry_run)
+    except ValueError as e:
+        print(f"取り込めません: {e}")
+        return 2
+    rejected = result['rejected']
+    print(f"{result['rows']}行中 {result['rows'] - len(rejected)}行が正しく、{len(rejected)}行を除外しました")
+    print(("書き込む列: " if args.dry_run else f"{result['loaded']}行を書き込みました。列: ") + ", ".join(result['fields']))
+    if len(rejected):
+        for r in rejected.head(10).itertuples():
+            print(f"  {r.行}行目: {r.理由}")
+        if args.rejects:
+            rejected.to_csv(args.rejects, index=False, encoding='utf-8-sig')
+            print(f"除外した行を {args.rejects} に書き出しました")
+    return 0 if rejected.empty else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
\ No newline at end of file
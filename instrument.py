@@ -0,0 +1,147 @@
+import functools
+import itertools
+import os
+import threading
+import time
+from collections import deque
+
+# --- 計測 ---
+# database の関数と主な画面の関数の呼び出し回数・所要時間・返した行数・コミット数を記録する
+# 記録は上限つきのリングバッファに入れるだけなので、止めている間は呼び出しごとにフラグを1回見るだけになる
+# 環境変数 TSC_INSTRUMENT=0 で起動時から止められる（管理者の画面からも切り替えられる）
+
+ENABLED = os.environ.get('TSC_INSTRUMENT', '1') != '0'
+SLOW_MS = float(os.environ.get('TSC_SLOW_MS', '100'))  # これより遅い呼び出しを低速ログに残す
+BUFFER_SIZE = 5000
+SLOW_LOG_SIZE = 200
+
+# 記録1件: (再実行の番号, 種類, 関数名, 開始時刻, ミリ秒, 行数, 同じ種類の呼び出しの入れ子の深さ)
+_events = deque(maxlen=BUFFER_SIZE)
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_commits = deque(maxlen=BUFFER_SIZE)
+_rerun_ids = itertools.count(1)
+_local = threading.local()
+
+def start_rerun():
+    """
+    このスレッドの以降の記録を新しい再実行としてまとめる。その番号を返す
+    """
+    _local.rerun = next(_rerun_ids)
+    return _local.rerun
+
+def _rows(result):
+    # 返した行数。1行分の辞書（列名→値）は1行と数え、タプル（値の組）は数えない
+    if result is None or isinstance(result, (str, bytes, int, float, tuple)):
+        return None
+    if isinstance(result, dict):
+        first = next(iter(result.values()), None)
+        return len(result) if isinstance(first, (dict, list)) else 1
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+def timed(kind):
+    """
+    呼び出しを記録するデコレーター。kind は 'db' や 'view' など
+    """
+    def decorate(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            depth = getattr(_local, kind, 0)
+            setattr(_local, kind, depth + 1)
+            rows = None
+            t0 = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                rows = _rows(result)
+                return result
+            finally:
+                # st.rerun() などの例外で抜けた場合も時間は残す
+                ms = (time.perf_counter() - t0) * 1000
+                setattr(_local, kind, depth)
+                rerun = getattr(_local, 'rerun', 0)
+                _events.append((rerun, kind, name, time.time(), ms, rows, depth))
+                if ms >= SLOW_MS:
+                    # 引数はパスワードなどを含むことがあるので残さない
+                    _slow.append((rerun, kind, name, time.time(), ms, rows, depth))
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorate
+
+def instrument_module(namespace, kind, exclude=(), include=()):
+    """
+    モジュールの globals() を受け取り、そのモジュールで定義された公開の関数と include の関数を timed で包む
+    モジュール内からの呼び出しも globals 経由なので記録される
+    """
+    module = namespace['__name__']
+    for name, obj in list(namespace.items()):
+        if name.startswith('_') and name not in include:
+            continue
+        if (callable(obj) and getattr(obj, '__module__', None) == module and not isinstance(obj, type)
+                and name not in exclude and not hasattr(obj, '__wrapped__')):
+            namespace[name] = timed(kind)(obj)
+
+def configure(enabled=None, slow_ms=None):
+    global ENABLED, SLOW_MS
+    if enabled is not None:
+        ENABLED = enabled
+    if slow_ms is not None:
+        SLOW_MS = float(slow_ms)
+
+def record_commit():
+    if ENABLED:
+        _commits.append(getattr(_local, 'rerun', 0))
+
+def _event_dict(e):
+    return {'rerun': e[0], 'kind': e[1], 'name': e[2], 'time': e[3], 'ms': e[4], 'rows': e[5], 'depth': e[6]}
+
+def summary(rerun=None):
+    """
+    関数ごとの集計（回数・合計/最大ミリ秒・行数）。rerun を指定するとその再実行だけ
+    合計ミリ秒は入れ子の内側も含む（外側の関数の時間に内側の時間が重なる）
+    """
+    by_name = {}
+    for e in list(_events):
+        if rerun is not None and e[0] != rerun:
+            continue
+        s = by_name.setdefault((e[1], e[2]), {'kind': e[1], 'name': e[2], 'calls': 0, 'total_ms': 0.0,
+                                             'max_ms': 0.0, 'rows': 0})
+        s['calls'] += 1
+        s['total_ms'] += e[4]
+        s['max_ms'] = max(s['max_ms'], e[4])
+        s['rows'] += e[5] or 0
+    return sorted(by_name.values(), key=lambda s: -s['total_ms'])
+
+def rerun_totals(rerun):
+    # 再実行1回分の合計。時間は入れ子の一番外側の呼び出しだけを足す
+    events = [e for e in list(_events) if e[0] == rerun]
+    return {
+        'rerun': rerun,
+        'calls': len(events),
+        'db_calls': sum(1 for e in events if e[1] == 'db'),
+        'db_ms': sum(e[4] for e in events if e[1] == 'db' and e[6] == 0),
+        'view_ms': sum(e[4] for e in events if e[1] == 'view' and e[6] == 0),
+        'rows': sum(e[5] or 0 for e in events if e[1] == 'db' and e[6] == 0),
+        'commits': sum(1 for r in list(_commits) if r == rerun),
+    }
+
+def slow_log():
+    return [_event_dict(e) for e in list(_slow)]
+
+def export():
+    # JSON にそのまま書き出せる形で、設定・集計・低速ログ・全記録を返す
+    return {
+        'enabled': ENABLED, 'slow_ms': SLOW_MS,
+        'summary': summary(), 'slow': slow_log(),
+        'events': [_event_dict(e) for e in list(_events)],
+    }
+
+def clear():
+    _events.clear()
+    _slow.clear()
+    _commits.clear()
\ No newline at end of file
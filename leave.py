@@ -0,0 +1,55 @@
+from datetime import date
+import database
+
+# --- 休暇台帳 ---
+# 付与・繰越・取得から残りを求める。残り = 付与 + 繰越 - 取得（期間は暦年）
+# 振替休暇は休日勤務の日と古い順に組にする。組にならない休日勤務は振替休暇の残り、組にならない振替休暇は前借り
+
+PAID_LEAVE = '有給休暇'
+# 付与を記録する休暇の種類（振替休暇は休日勤務から決まるので記録しない）
+GRANT_TYPES = ['有給休暇', '特別休暇']
+
+def _year(year):
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+def year_balances(year, user_ids=None, leave_types=database.LEAVE_LEDGER_TYPES):
+    """
+    year 年の休暇の残りを {user_id: {休暇の種類: {'granted', 'carried', 'used', 'balance'}}} で返す
+    """
+    result = {}
+    for r in database.get_leave_balances(*_year(year), leave_types, user_ids):
+        result.setdefault(r['user_id'], {})[r['leave_type']] = {
+            k: r[k] for k in ('granted', 'carried', 'used', 'balance')}
+    return result
+
+def pair_substitute_days(start, end, user_ids=None):
+    """
+    start <= 日付 < end の休日勤務と振替休暇を、メンバーごとに古い順で1日ずつ組にする
+    戻り値は {user_id: {'pairs': [(休日勤務の日, 振替休暇の日), ...], 'unpaired_work': [...], 'unpaired_leave': [...]}}
+    日付は 'YYYY-MM-DD'。振替休暇を先に取った場合（前借り）も、後の休日勤務と組になる
+    """
+    days = {}
+    for r in database.get_leave_days(start, end, [database.HOLIDAY_WORK, database.SUBSTITUTE_LEAVE], user_ids):
+        days.setdefault(r['user_id'], {}).setdefault(r['leave_type'], []).append(r['date'])
+    result = {}
+    for uid, by_type in days.items():
+        work = by_type.get(database.HOLIDAY_WORK, [])
+        leave = by_type.get(database.SUBSTITUTE_LEAVE, [])
+        n = min(len(work), len(leave))
+        result[uid] = {'pairs': list(zip(work[:n], leave[:n])),
+                       'unpaired_work': work[n:], 'unpaired_leave': leave[n:]}
+    return result
+
+def carry_over(year, leave_type=PAID_LEAVE):
+    """
+    year 年の残りを翌年1月1日付の繰越として記録し、繰り越した人数を返す
+    繰り越せるのはその年に付与した日数まで（前年からの繰越分は先に使ったものとし、付与から2年で消える）
+    何度実行しても、その年の繰越は最新の残りで置き換わる
+    """
+    rows = []
+    for r in database.get_leave_balances(*_year(year), [leave_type]):
+        days = min(r['balance'], r['granted'])
+        if days > 0:
+            rows.append((r['user_id'], days, f"{year}年から繰越"))
+    database.replace_leave_carryovers(leave_type, date(year + 1, 1, 1), rows)
+    return len(rows)
\ No newline at end of file
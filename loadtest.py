@@ -0,0 +1,107 @@
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+import database
+
+# --- 打刻の負荷試験 ---
+# 朝の出勤時刻に共用端末から一斉に打刻される状況をまねて、出勤→退勤を同時に記録する
+# 使い方: python loadtest.py --users 300 --threads 32 --processes 4
+# --db を省略すると一時ファイルに作るので、本番の attendance.db には書き込まない
+
+def _punch_all(db_name, user_ids, threads, day):
+    """
+    user_ids の全員を threads 本のスレッドで出勤→退勤させる
+    (1回ごとの所要秒のリスト, 失敗した回数) を返す
+    """
+    database.DB_NAME = db_name
+    start = threading.Event()
+    latencies, errors = [], []
+    clock_in_at = datetime(day.year, day.month, day.day, 8, 30, tzinfo=database.JST)
+    clock_out_at = datetime(day.year, day.month, day.day, 17, 15, tzinfo=database.JST)
+
+    def punch(user_id):
+        start.wait()
+        for fn, args in ((database.clock_in, (user_id, "Office", clock_in_at)),
+                         (database.clock_out, (user_id, clock_out_at))):
+            t0 = time.perf_counter()
+            try:
+                fn(*args)
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+            latencies.append(time.perf_counter() - t0)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(punch, u) for u in user_ids]
+        start.set()
+        for f in futures:
+            f.result()
+    return latencies, len(errors)
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+def run(db_name, users, threads, processes, day):
+    database.DB_NAME = db_name
+    database.create_tables()
+    user_ids = [f"load{i:04d}" for i in range(users)]
+    database.sync_users([(u, "", "負荷試験", "staff") for u in user_ids])
+
+    t0 = time.perf_counter()
+    if processes <= 1:
+        latencies, errors = _punch_all(db_name, user_ids, threads, day)
+    else:
+        chunks = [user_ids[i::processes] for i in range(processes)]
+        latencies, errors = [], 0
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            for lat, err in pool.map(_punch_all, [db_name] * processes, chunks,
+                                     [threads] * processes, [day] * processes):
+                latencies += lat
+                errors += err
+    elapsed = time.perf_counter() - t0
+
+    # 全員分の出勤・退勤がそろって記録されたか確かめる
+    with database.read_cursor() as c:
+        complete = c.execute("""
+            SELECT COUNT(*) FROM attendance
+            WHERE date=? AND user_id LIKE 'load%' AND start_min IS NOT NULL AND end_min IS NOT NULL
+        """, (day.isoformat(),)).fetchone()[0]
+    return {
+        'punches': len(latencies), 'errors': errors, 'elapsed': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': _percentile(latencies, 50) * 1000, 'p99_ms': _percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'complete': complete, 'users': users,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="出勤・退勤の同時打刻の負荷試験")
+    parser.add_argument('--db', help="データベースファイル（省略時は一時ファイル）")
+    parser.add_argument('--users', type=int, default=300, help="打刻する人数")
+    parser.add_argument('--threads', type=int, default=32, help="プロセスごとのスレッド数")
+    parser.add_argument('--processes', type=int, default=1, help="プロセス数")
+    parser.add_argument('--date', default=datetime.now(database.JST).date().isoformat(), help="打刻する日（YYYY-MM-DD）")
+    args = parser.parse_args(argv)
+    day = datetime.strptime(args.date, '%Y-%m-%d').date()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = args.db or os.path.join(tmp, 'loadtest.db')
+        r = run(db_name, args.users, args.threads, args.processes, day)
+        database.close_connection()
+
+    print(f"{r['users']}人 × 出勤・退勤（{args.processes}プロセス × {args.threads}スレッド）")
+    print(f"打刻 {r['punches']}回 / 失敗 {r['errors']}回 / 所要 {r['elapsed']:.2f}秒 / {r['throughput']:.0f}回/秒")
+    print(f"待ち時間 p50={r['p50_ms']:.1f}ms p99={r['p99_ms']:.1f}ms 平均={r['mean_ms']:.1f}ms")
+    print(f"出勤・退勤がそろった記録: {r['complete']}/{r['users']}件")
+    return 0 if r['errors'] == 0 and r['complete'] == r['users'] else 1
+
+if __name__ == '__main__':
+    raise SystemExit(main())
\ No newline at end of file
@@ -0,0 +1,171 @@
+import argparse
+from datetime import date, timedelta
+import backup
+import database
+import export
+import leave
+
+# --- 保守用コマンド ---
+# 使い方: python maintenance.py verify-summary
+#         python maintenance.py archive --year 2024 --compact
+#         python maintenance.py backup --every 3600 --keep-last 24 --keep-daily 14
+#         python maintenance.py export --start 2025-04-01 --end 2025-04-30 --format xlsx --out 2025-04.xlsx
+
+def verify_summary(args):
+    drift = database.verify_monthly_summary()
+    if not drift:
+        print("月次サマリーは attendance と一致しています")
+        return 0
+    for d in drift:
+        print(f"【不一致】{d['user_id']} {d['year']}年{d['month']}月 {d['field']}: "
+              f"集計値={d['expected']} 保存値={d['stored']}")
+    print(f"--- {len(drift)}件の不一致があります（rebuild-summary で作り直せます） ---")
+    return 1
+
+def rebuild_summary(args):
+    count = database.rebuild_monthly_summary()
+    print(f"月次サマリーを作り直しました（{count}件）")
+    return 0
+
+def export_payroll(args):
+    # 終了日はその日を含める
+    start, end = date.fromisoformat(args.start), date.fromisoformat(args.end) + timedelta(days=1)
+    if args.format == 'xlsx':
+        count = export.write_xlsx(args.out, start, end, args.dept)
+    else:
+        with open(args.out, 'w', encoding='utf-8-sig', newline='') as f:
+            count = export.write_csv(f, start, end, args.dept, kind=args.kind)
+    print(f"{args.out} に書き出しました（{count}行）")
+    return 0
+
+def _export_arguments(p):
+    p.add_argument('--start', required=True, help="開始日（YYYY-MM-DD）")
+    p.add_argument('--end', required=True, help="終了日（YYYY-MM-DD、この日を含む）")
+    p.add_argument('--dept', nargs='*', help="部署（省略時は全部署）")
+    p.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    p.add_argument('--kind', choices=['day', 'total'], default='day', help="CSV の内容（明細かメンバー別合計）")
+    p.add_argument('--out', required=True, help="書き出すファイル")
+
+def archive(args):
+    try:
+        rows = database.archive_year(args.year)
+    except ValueError as e:
+        print(f"アーカイブできません: {e}")
+        return 2
+    print(f"{args.year}年の記録 {rows}件を {database.archive_path(args.year)} へ移しました")
+    if args.compact:
+        return compact(args)
+    return 0
+
+def _archive_arguments(p):
+    p.add_argument('--year', type=int, required=True, help="アーカイブする年（前年以前）")
+    p.add_argument('--compact', action='store_true', help="移したあと本体のデータベースを詰める")
+
+def list_archives(args):
+    archives = database.get_archives()
+    if not archives:
+        print("アーカイブはありません")
+    for a in archives:
+        print(f"{a['year']}年: {a['rows']}件 {a['path']}（{a['archived_at']}）")
+    return 0
+
+def verify_archive(args):
+    problems = database.verify_archives()
+    if not problems:
+        print("アーカイブは月次サマリーと一致しています")
+        return 0
+    for p in problems:
+        print(f"【不一致】{p}")
+    return 1
+
+def compact(args):
+    before, after = database.compact()
+    print(f"データベースを詰めました（{before / 1024 / 1024:.1f}MB → {after / 1024 / 1024:.1f}MB）")
+    return 0
+
+def carry_over(args):
+    count = leave.carry_over(args.year, args.type)
+    print(f"{args.year}年の{args.type}の残りを {count}人分 {args.year + 1}年へ繰り越しました")
+    return 0
+
+def _carry_over_arguments(p):
+    p.add_argument('--year', type=int, required=True, help="繰り越す元の年")
+    p.add_argument('--type', default=leave.PAID_LEAVE, choices=leave.GRANT_TYPES, help="休暇の種類")
+
+def _print_snapshot(stats):
+    if isinstance(stats, Exception):
+        print(f"バックアップできませんでした: {stats}")
+        return
+    print(f"{stats['path']} を作りました（{stats['bytes'] / 1024 / 1024:.1f}MB, {stats['pages']}ページ, "
+          f"{stats['steps']}回 / 写し直し {stats['restarts']}回, {stats['ms']:.0f}ms + 検査 {stats['check_ms']:.0f}ms）")
+    for path in stats['removed']:
+        print(f"  古いスナップショットを消しました: {path}")
+
+def take_backup(args):
+    if args.every:
+        try:
+            backup.run_schedule(args.every, keep_last=args.keep_last, keep_daily=args.keep_daily,
+                                report=_print_snapshot)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    _print_snapshot(backup.snapshot(keep_last=args.keep_last, keep_daily=args.keep_daily))
+    return 0
+
+def _backup_arguments(p):
+    p.add_argument('--every', type=int, help="この秒数ごとに作り続ける（省略時は1回だけ）")
+    p.add_argument('--keep-last', type=int, default=backup.KEEP_LAST, help="新しい順に残す数")
+    p.add_argument('--keep-daily', type=int, default=backup.KEEP_DAILY, help="日ごとに1つ残す日数")
+
+def list_backups(args):
+    snapshots = backup.list_snapshots()
+    if not snapshots:
+        print("スナップショットはありません")
+    for s in snapshots:
+        print(f"{s['created']:%Y-%m-%d %H:%M:%S}  {s['bytes'] / 1024 / 1024:6.1f}MB  {s['path']}")
+    return 0
+
+def restore_backup(args):
+    try:
+        result = backup.restore(args.source)
+    except ValueError as e:
+        print(f"復元できません: {e}")
+        return 2
+    print(f"{args.source} から復元しました（{result['pages']}ページ, {result['ms']:.0f}ms）")
+    print(f"復元前の内容は {result['saved']} に退避しました")
+    return 0
+
+def _restore_arguments(p):
+    p.add_argument('--from', dest='source', required=True, help="復元するスナップショット")
+
+# コマンド名: (関数, 説明, 引数を足す関数)
+COMMANDS = {
+    'verify-summary': (verify_summary, "月次サマリーと attendance の食い違いを調べる", None),
+    'rebuild-summary': (rebuild_summary, "月次サマリーを attendance から作り直す", None),
+    'export': (export_payroll, "給与計算用に勤怠を CSV / Excel で書き出す", _export_arguments),
+    'carry-over': (carry_over, "休暇の残りを翌年へ繰り越す", _carry_over_arguments),
+    'archive': (archive, "締めた年の記録をアーカイブへ移す", _archive_arguments),
+    'archives': (list_archives, "アーカイブ済みの年の一覧", None),
+    'verify-archive': (verify_archive, "アーカイブと月次サマリーの食い違いを調べる", None),
+    'compact': (compact, "データベースを詰める（VACUUM / ANALYZE）", None),
+    'backup': (take_backup, "動かしたままスナップショットを作る（--every で定期実行）", _backup_arguments),
+    'backups': (list_backups, "スナップショットの一覧", None),
+    'restore': (restore_backup, "スナップショットを検査してから書き戻す", _restore_arguments),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TSC 勤怠システムの保守コマンド")
+    parser.add_argument('--db', default=database.DB_NAME, help="データベースファイル")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, (func, help_text, add_arguments) in COMMANDS.items():
+        p = sub.add_parser(name, help=help_text)
+        if add_arguments:
+            add_arguments(p)
+        p.set_defaults(func=func)
+    args = parser.parse_args(argv)
+    database.DB_NAME = args.db
+    database.create_tables()
+    return args.func(args)
+
+if __name__ == '__main__':
+    raise SystemExit(main())
\ No newline at end of file
@@ -0,0 +1,159 @@
+import argparse
+import hmac
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+import auth
+import database
+import worktime
+
+# --- 打刻API（入口の共用端末用） ---
+# Streamlit の画面を通さずに出勤・退勤・本日の状況を扱う小さな HTTP サーバー
+# 使い方: python punch_api.py --port 8502
+#   POST /clock-in   {"username": "...", "password": "...", "work_tag": "..."}
+#   POST /clock-out  {"username": "...", "password": "..."}
+#   GET  /today?username=...  （認証は下記と同じ。パスワードは X-Password ヘッダー）
+#   POST /batch      {"punches": [{"username": "...", "action": "in" | "out", "time": "2025-04-01T08:30:00"}, ...]}
+# 端末用のトークン（環境変数 TSC_DEVICE_TOKENS にカンマ区切り）を Authorization: Bearer で送れば
+# パスワードは省略できる
+
+DEFAULT_WORK_TAG = "Academy"
+
+def device_tokens():
+    return [t.strip() for t in os.environ.get('TSC_DEVICE_TOKENS', '').split(',') if t.strip()]
+
+def _has_device_token(request):
+    header = request.headers.get('authorization', '')
+    if not header.lower().startswith('bearer '):
+        return False
+    token = header[7:].strip()
+    return any(hmac.compare_digest(token, t) for t in device_tokens())
+
+def _authenticate(request, username, password):
+    # 端末トークンがあれば登録済みのユーザーかだけを確かめ、無ければパスワードで確かめる
+    # JSON では文字列以外（配列など）も送れるので、文字列でなければ認証しない
+    if not username or not isinstance(username, str) or not isinstance(password, (str, type(None))):
+        return None
+    if _has_device_token(request):
+        return database.get_user_by_username(username)
+    return auth.login_user(username, password or "")
+
+def _parse_time(value):
+    # 'YYYY-MM-DDTHH:MM[:SS]'。タイムゾーンが無ければ日本時間とみなす
+    when = datetime.fromisoformat(value)
+    return when.replace(tzinfo=database.JST) if when.tzinfo is None else when.astimezone(database.JST)
+
+def _status(username, rec):
+    rec = rec or {}
+    return {
+        'username': username, 'status': rec.get('status', 'not_started'),
+        'start': worktime.format_minutes(rec.get('start_min')), 'end': worktime.format_minutes(rec.get('end_min')),
+    }
+
+def _work_tag(value):
+    return value if isinstance(value, str) and value else DEFAULT_WORK_TAG
+
+def _error(message, status_code):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+async def _json_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    return body if isinstance(body, dict) else None
+
+async def clock_in(request):
+    body = await _json_body(request)
+    if body is None:
+        return _error("JSON のオブジェクトを送ってください", 400)
+    user = await run_in_threadpool(_authenticate, request, body.get('username'), body.get('password'))
+    if user is None:
+        return _error("ユーザー名またはパスワードが違います", 401)
+    recorded = await run_in_threadpool(database.clock_in, user['id'], _work_tag(body.get('work_tag')))
+    rec = await run_in_threadpool(database.get_today_record, user['id'])
+    return JSONResponse({**_status(user['username'], rec), 'recorded': recorded})
+
+async def clock_out(request):
+    body = await _json_body(request)
+    if body is None:
+        return _error("JSON のオブジェクトを送ってください", 400)
+    user = await run_in_threadpool(_authenticate, request, body.get('username'), body.get('password'))
+    if user is None:
+        return _error("ユーザー名またはパスワードが違います", 401)
+    await run_in_threadpool(database.clock_out, user['id'])
+    rec = await run_in_threadpool(database.get_today_record, user['id'])
+    return JSONResponse({**_status(user['username'], rec), 'recorded': True})
+
+async def today(request):
+    user = await run_in_threadpool(_authenticate, request, request.query_params.get('username'),
+                                   request.headers.get('x-password'))
+    if user is None:
+        return _error("ユーザー名またはパスワードが違います", 401)
+    rec = await run_in_threadpool(database.get_today_record, user['id'])
+    return JSONResponse(_status(user['username'], rec))
+
+def _check_punch(request, p):
+    """
+    ためておいた打刻1件を確かめ、(user_id, 'in'/'out', 日時, 勤務区分) かエラーの文を返す
+    """
+    if not isinstance(p, dict):
+        return "打刻の形式が正しくありません"
+    if p.get('action') not in ('in', 'out'):
+        return "action は in か out を指定してください"
+    try:
+        when = _parse_time(str(p.get('time', '')))
+    except ValueError:
+        return "time の形式が正しくありません"
+    if database.is_archived_year(when.year):
+        return f"{when.year}年はアーカイブ済みのため記録できません"
+    user = _authenticate(request, p.get('username'), p.get('password'))
+    if user is None:
+        return "ユーザー名またはパスワードが違います"
+    return (user['id'], p['action'], when, _work_tag(p.get('work_tag')))
+
+def _record_batch(request, punches):
+    checked = [_check_punch(request, p) for p in punches]
+    valid = [c for c in checked if isinstance(c, tuple)]
+    recorded = iter(database.record_punches(valid) if valid else [])
+    return [{'ok': True, 'recorded': next(recorded)} if isinstance(c, tuple) else {'ok': False, 'error': c}
+            for c in checked]
+
+async def batch(request):
+    # 正しい打刻だけを1トランザクションで記録し、結果を送られてきた順に返す
+    body = await _json_body(request)
+    if body is None or not isinstance(body.get('punches'), list):
+        return _error("punches に打刻の一覧を指定してください", 400)
+    results = await run_in_threadpool(_record_batch, request, body['punches'])
+    return JSONResponse({'results': results})
+
+@asynccontextmanager
+async def lifespan(app):
+    database.create_tables()
+    yield
+
+def create_app():
+    return Starlette(routes=[
+        Route('/clock-in', clock_in, methods=['POST']),
+        Route('/clock-out', clock_out, methods=['POST']),
+        Route('/today', today, methods=['GET']),
+        Route('/batch', batch, methods=['POST']),
+    ], lifespan=lifespan)
+
+def main(argv=None):
+    import uvicorn
+    parser = argparse.ArgumentParser(description="TSC 勤怠システムの打刻API")
+    parser.add_argument('--db', default=database.DB_NAME, help="データベースファイル")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args(argv)
+    database.DB_NAME = args.db
+    uvicorn.run(create_app(), host=args.host, port=args.port)
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
\ No newline at end of file
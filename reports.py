@@ -0,0 +1,124 @@
+from datetime import date, timedelta
+import pandas as pd
+import database
+import leave
+import schedule
+
+# 集計表の列名（分 → 時間に換算して表示する列）
+HOUR_COLUMNS = {
+    'plan_work': '予定時間',
+    'plan_break': '予定休憩',
+    'actual_work': '実績時間',
+    'actual_break': '実績休憩',
+    'overtime': '超過時間',
+}
+
+def monthly_rollup(year, month, leave_types=()):
+    """
+    全メンバーの月次集計を DataFrame で返す（1行1メンバー）
+    """
+    return period_rollup(*database.month_range(year, month), leave_types=leave_types)
+
+def period_rollup(start, end, leave_types=()):
+    rows = database.get_rollup(start, end, leave_types)
+    leave_types = [lt for lt in leave_types if lt]
+    df = pd.DataFrame(rows, columns=['username', 'department', 'plan_days', 'work_days'] + list(HOUR_COLUMNS))
+    for col in HOUR_COLUMNS:
+        df[col] = (df[col] / 60).round(2)
+    for lt in leave_types:
+        df[lt] = [r['leave_counts'][lt] for r in rows]
+    return df.rename(columns={'username': '氏名', 'department': '部署', 'plan_days': '予定日数',
+                              'work_days': '出勤日数', **HOUR_COLUMNS})
+
+def department_rollup(df):
+    # メンバー別の集計を部署ごとに合計し、最後に全体の合計行を付ける
+    by_dept = df.drop(columns=['氏名']).groupby('部署', sort=False).sum(numeric_only=True)
+    by_dept['人数'] = df.groupby('部署', sort=False).size()
+    count_cols = by_dept.select_dtypes('integer').columns
+    by_dept.loc['合計'] = by_dept.sum(numeric_only=True)
+    by_dept[count_cols] = by_dept[count_cols].astype(int)
+    return by_dept.round(2).reset_index()
+
+# --- 年間計画 ---
+# 実績の累計は月次サマリー（トリガーで差分更新）からウィンドウ関数で求めるので、日ごとの記録は読まない
+
+def remaining_workdays(holiday_type, year, today):
+    """
+    today の翌日から年末までの出勤日数（勤務パターンの休みの曜日・祝日を除く）
+    パターンの無いメンバーは schedule.pattern_rules と同じく毎日出勤として数える
+    """
+    start = max(today + timedelta(days=1), date(year, 1, 1))
+    end = date(year + 1, 1, 1)
+    if start >= end:
+        return 0
+    return schedule.workdays_between(holiday_type, start, end)
+
+def annual_plan_rollup(year, patterns, today):
+    """
+    メンバーごとの年間計画と実績の累計、残りの出勤日から見た年末の見込みを返す
+    patterns: {user_id: 勤務パターン}
+    戻り値は (1行1メンバーの DataFrame, 月ごとの累計の DataFrame（氏名・月・実績累計・計画ペース）)
+    見込み = 実績累計 + 残り出勤日 × 出勤1日あたりの実績（まだ出勤が無ければ予定1日あたりの時間）
+    """
+    users = database.get_users()
+    plans = database.get_annual_plans(year)
+    ytd = pd.DataFrame(database.get_ytd_summaries(year),
+                       columns=['user_id', 'month', 'ytd_plan_days', 'ytd_work_days', 'ytd_plan_work', 'ytd_actual_work'])
+    last = ytd.groupby('user_id').last()
+    by_user = {uid: g.set_index('month')['ytd_actual_work'] for uid, g in ytd.groupby('user_id')}
+    # 累計を表示する最後の月（過去の年は12月、今年は今月まで）
+    last_month = 12 if year < today.year else (today.month if year == today.year else 0)
+
+    rows, monthly = [], []
+    for u in users:
+        t = last.loc[u['id']] if u['id'] in last.index else None
+        actual = float(t['ytd_actual_work']) / 60 if t is not None else 0.0
+        work_days = int(t['ytd_work_days']) if t is not None else 0
+        plan_days = int(t['ytd_plan_days']) if t is not None else 0
+        if work_days:
+            per_day = actual / work_days
+        else:
+            per_day = float(t['ytd_plan_work']) / 60 / plan_days if plan_days else 0.0
+        holiday_type = patterns.get(u['id'])
+        remaining = remaining_workdays(holiday_type, year, today)
+        plan = plans.get(u['username'])
+        projected = actual + remaining * per_day
+        rows.append({
+            '氏名': u['username'], '部署': u['department'], '年間計画': plan,
+            '実績累計': round(actual, 2), '達成率': round(actual / plan * 100, 1) if plan else None,
+            '残り出勤日': remaining, '1日平均': round(per_day, 2), '見込み': round(projected, 2),
+            '計画との差': round(projected - plan, 2) if plan else None,
+        })
+
+        # 月ごとの累計。記録の無い月は前の月の累計のまま
+        cumulative = by_user.get(u['id'], pd.Series(dtype=float)).reindex(range(1, 13)).ffill().fillna(0) / 60
+        year_days = schedule.workdays_between(holiday_type, date(year, 1, 1), date(year + 1, 1, 1))
+        for m in range(1, last_month + 1):
+            month_end = date(year, m + 1, 1) if m < 12 else date(year + 1, 1, 1)
+            done = schedule.workdays_between(holiday_type, date(year, 1, 1), month_end)
+            monthly.append({
+                '氏名': u['username'], '月': m, '実績累計': round(cumulative[m], 2),
+                # 年間計画を出勤日の割合で月末までに割り振った値
+                '計画ペース': round(plan * done / year_days, 2) if plan and year_days else None,
+            })
+    return pd.DataFrame(rows), pd.DataFrame(monthly, columns=['氏名', '月', '実績累計', '計画ペース'])
+
+# --- 休暇台帳 ---
+
+LEAVE_COLUMNS = {'granted': '付与', 'carried': '繰越', 'used': '取得', 'balance': '残り'}
+
+def leave_balance_rollup(year, leave_types=database.LEAVE_LEDGER_TYPES):
+    """
+    全メンバーの year 年の休暇の付与・繰越・取得・残りを DataFrame で返す（1行1メンバー、列は「有給休暇 残り」など）
+    振替休暇の付与は休日勤務の日数
+    """
+    balances = leave.year_balances(year, leave_types=leave_types)
+    rows = []
+    for u in database.get_users():
+        row = {'氏名': u['username'], '部署': u['department']}
+        for lt in leave_types:
+            b = balances.get(u['id'], {}).get(lt)
+            for key, label in LEAVE_COLUMNS.items():
+                row[f"{lt} {label}"] = b[key] if b else 0
+        rows.append(row)
+    return pd.DataFrame(rows)
\ No newline at end of file
@@ -0,0 +1,92 @@
+from datetime import date
+import database
+import utils
+import worktime
+
+# --- 勤務パターン ---
+# パターンごとに (休みの曜日, 祝日も休みにするか) を持つ。曜日は 月=0 ... 日=6
+PATTERN_RULES = {
+    "sh": ((5, 6), True),
+    "sun_holi": ((6,), True),
+    "sat": ((5,), False),
+    "sat_holi": ((5,), True),
+}
+
+SCHEDULE_FIELDS = ['scheduled_start_min', 'scheduled_end_min', 'scheduled_break_duration']
+
+def pattern_rules(holiday_type):
+    # (休みの曜日, 祝日も休みにするか)。未知のパターン（空文字や None など）は休みの無い毎日出勤扱い
+    return PATTERN_RULES.get(holiday_type, ((), False))
+
+def workday_mask(holiday_type, year):
+    """
+    1年分の出勤日マスク（utils の出勤日ビット列）。1月1日を0番目として、出勤日なら 1
+    """
+    off_weekdays, holidays_off = pattern_rules(holiday_type)
+    return utils.workday_index(year, off_weekdays, holidays_off)[0]
+
+def workdays_between(holiday_type, start, end):
+    # 勤務パターンで数えた start <= 日付 < end の出勤日数（予定の作成と同じ日を数える）
+    off_weekdays, holidays_off = pattern_rules(holiday_type)
+    return utils.business_days_between(start, end, off_weekdays, holidays_off)
+
+def workdays_in_month(holiday_type, year, month):
+    return workdays_between(holiday_type, *_period(year, month))
+
+def _period(year, month=None):
+    # month を省略すると1年分
+    if month is None:
+        return date(year, 1, 1), date(year + 1, 1, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return date(year, month, 1), end
+
+def build_schedule_rows(def_start, def_end, holiday_type, start, end, skip_dates=()):
+    """
+    start <= 日付 < end の出勤日の予定を {日付: 列の値} で作る（書き込みはしない）
+    skip_dates に含まれる日付文字列（既に記録がある日）は作らない
+    """
+    if not (def_start and def_end):
+        return {}
+    # 時刻の解釈はメンバーごとに1回だけ
+    ps = worktime.parse_hhmm(def_start)
+    pe = worktime.parse_hhmm(def_end)
+    
+    rows = {}
+    for o in range(start.toordinal(), end.toordinal()):
+        d = date.fromordinal(o)
+        if not workday_mask(holiday_type, d.year)[d.timetuple().tm_yday - 1]:
+            continue
+        if d.isoformat() in skip_dates:
+            continue
+        rows[d] = {
+            'scheduled_start_min': ps,
+            'scheduled_end_min': pe,
+            'scheduled_break_duration': worktime.DEFAULT_BREAK,
+        }
+    return rows
+
+def generate_schedules(members, year, month=None):
+    """
+    members: (user_id, 開始時刻, 終了時刻, 勤務パターン) の並び
+    指定した月（省略時は1年分）で、記録がまだ無い出勤日に予定を作る。全員分を1トランザクションで書き込み、作成した日数を返す
+    アーカイブ済みの年には作らない
+    """
+    members = [m for m in members if m[1] and m[2]]
+    if not members or database.is_archived_year(year):
+        return 0
+    start, end = _period(year, month)
+    user_id = members[0][0] if len(members) == 1 else None
+    existing = {}
+    for uid, d_str in database.get_record_dates(start, end, user_id=user_id):
+        existing.setdefault(uid, set()).add(d_str)
+    
+    created = 0
+    with database.transaction():
+        for uid, def_start, def_end, holiday_type in members:
+            rows = build_schedule_rows(def_start, def_end, holiday_type, start, end, existing.get(uid, ()))
+            database.upsert_attendance_records(uid, rows, fields=SCHEDULE_FIELDS)
+            created += len(rows)
+    return created
+
+def generate_schedule(user_id, def_start, def_end, holiday_type, year, month=None):
+    return generate_schedules([(user_id, def_start, def_end, holiday_type)], year, month)
\ No newline at end of file
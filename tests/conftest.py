@@ -0,0 +1,23 @@
+import os
+import sys
+import pytest
+
+# リポジトリ直下のモジュール（worktime, database など）を import できるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+import database
+
+MEMBERS = [('a', '1234', '事務局', 'staff'), ('b', '1234', '事務局', 'staff'), ('c', '1234', '営業', 'staff')]
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # 一時ディレクトリに移行済みの空のデータベースを作り、MEMBERS を登録する
+    path = str(tmp_path / 'attendance.db')
+    monkeypatch.setattr(database, 'DB_NAME', path)
+    cache.clear_all()
+    database.migrate()
+    database.sync_users(MEMBERS)
+    yield path
+    database.close_connection()
+    cache.clear_all()
\ No newline at end of file
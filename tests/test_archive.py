@@ -0,0 +1,112 @@
+import os
+from datetime import date
+import pytest
+import database
+import export
+
+# --- 年ごとのアーカイブと、アーカイブを通した参照 ---
+
+def _fill(years, user_ids=('a', 'b')):
+    # 各年の1月と6月に1日ずつ、予定 8:30-17:15・実績 8:30-18:15 の記録を作る
+    for uid in user_ids:
+        database.upsert_attendance_records(uid, {
+            date(y, m, 10): {'scheduled_start_min': 510, 'scheduled_end_min': 1035, 'scheduled_break_duration': 60,
+                             'start_min': 510, 'end_min': 1095, 'break_duration': 60}
+            for y in years for m in (1, 6)})
+
+def test_archive_year_moves_rows_and_keeps_summary(db):
+    _fill([2019, 2020])
+    summary = database.get_monthly_summary('a', 2019, 6)
+    assert database.archive_year(2019) == 4
+    assert database.get_archived_years().keys() == {2019}
+    assert database.verify_archives() == []
+    with database.read_cursor() as c:
+        assert c.execute("SELECT COUNT(*) FROM main.attendance WHERE date < '2020-01-01'").fetchone()[0] == 0
+    # 月次サマリーは値がそのままで、version だけ増えている
+    after = database.get_monthly_summary('a', 2019, 6)
+    assert {f: after[f] for f in database.SUMMARY_FIELDS} == {f: summary[f] for f in database.SUMMARY_FIELDS}
+    assert after['version'] > summary['version']
+    assert database.verify_monthly_summary() == []
+
+def test_reads_go_through_the_archive(db):
+    _fill([2019, 2020])
+    before = database.get_records_between('a', date(2019, 1, 1), date(2021, 1, 1))
+    rollup = database.get_rollup(date(2019, 1, 1), date(2021, 1, 1))
+    database.archive_year(2019)
+    assert database.get_records_between('a', date(2019, 1, 1), date(2021, 1, 1)) == before
+    assert database.get_monthly_records('a', 2019, 6)[10]['end_min'] == 1095
+    assert database.get_rollup(date(2019, 1, 1), date(2021, 1, 1)) == rollup
+    assert database.get_record_dates(date(2019, 6, 1), date(2019, 7, 1)) == {('a', '2019-06-10'), ('b', '2019-06-10')}
+
+def test_archived_year_is_read_only(db):
+    _fill([2019])
+    database.archive_year(2019)
+    with pytest.raises(ValueError):
+        database.upsert_attendance_record('a', date(2019, 6, 11), note="x")
+    with pytest.raises(ValueError):
+        database.import_attendance_rows([('a', '2019-06-11', "x")], ['note'])
+    with pytest.raises(ValueError):
+        database.archive_year(2019)
+    assert database.verify_archives() == []
+
+def test_archive_year_refuses_empty_and_current_years(db):
+    with pytest.raises(ValueError):
+        database.archive_year(2019)
+    with pytest.raises(ValueError):
+        database.archive_year(date.today().year)
+    assert database.get_archives() == []
+
+def test_verify_with_more_archives_than_can_be_attached(db):
+    years = list(range(2008, 2008 + database.MAX_ATTACHED + 2))
+    _fill(years)
+    for y in years:
+        database.archive_year(y)
+    assert database.verify_archives() == []
+    assert database.verify_monthly_summary() == []
+    # 1年分ずつなら、ATTACH の上限を超えた数のアーカイブも順に読める
+    for y in years:
+        assert len(database.get_records_between('b', date(y, 1, 1), date(y + 1, 1, 1))) == 2
+def test_archived_years_are_checked_inside_the_write_transaction(db, monkeypatch):
+    # 確かめてから書くまでの間に別のプロセスが archive_year を終えられないよう、書き込みロックを持ったまま確かめる
+    seen = []
+    get_archived_years = database.get_archived_years
+
+    def spy():
+        seen.append(database.get_connection().in_transaction)
+        return get_archived_years()
+    monkeypatch.setattr(database, 'get_archived_years', spy)
+    database.upsert_attendance_record('a', date(2020, 6, 10), note="x")
+    database.import_attendance_rows([('a', '2020-06-11', "x")], ['note'])
+    database.clock_in('a', 'Office')
+    database.clock_out('a')
+    assert seen == [True] * 4
+def test_verify_archives_reports_problems(db):
+    _fill([2018, 2019])
+    database.archive_year(2018)
+    database.archive_year(2019)
+    # 本体に同じ年の記録が紛れ込んだ場合（check_writable を通らない書き込み）
+    with database.transaction() as c:
+        c.execute("INSERT INTO attendance (user_id, date, note) VALUES ('c', '2019-03-01', 'x')")
+    os.remove(database.get_archived_years()[2018])
+    problems = database.verify_archives()
+    assert problems[0].startswith("2018年: ファイルがありません")
+    # 紛れ込んだ行はトリガーで月次サマリーにも足されている
+    assert problems[1:] == ["2019年: 月次サマリーとアーカイブの合計が違います", "2019年: 本体にも 1 件の記録があります"]
+
+def test_long_ranges_are_limited_to_attachable_archives(db):
+    years = list(range(2008, 2008 + database.MAX_ATTACHED + 1))
+    _fill(years, user_ids=('a',))
+    for y in years:
+        database.archive_year(y)
+    with pytest.raises(ValueError):
+        database.get_records_between('a', date(years[0], 1, 1), date(years[-1] + 1, 1, 1))
+    assert len(database.get_records_between('a', date(years[1], 1, 1), date(years[-1] + 1, 1, 1))) == \
+        2 * database.MAX_ATTACHED
+
+def test_export_reads_archived_years(db):
+    _fill([2019, 2020])
+    start, end = date(2019, 1, 1), date(2021, 1, 1)
+    before = list(export.payroll_rows(start, end))
+    database.archive_year(2019)
+    assert list(export.payroll_rows(start, end)) == before
+    assert sum(kind == 'day' for kind, _ in before) == 8
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+import pytest
+import backup
+import database
+
+# --- バックアップと復元 ---
+
+def _record(user_id, day, **values):
+    database.upsert_attendance_record(user_id, day, **values)
+
+def test_snapshot_copies_a_checked_database(db):
+    _record('a', date(2025, 4, 1), start_min=510, end_min=1035)
+    stats = backup.snapshot()
+    assert os.path.dirname(stats['path']) == backup.backup_dir()
+    assert backup.check_integrity(stats['path']) == []
+    assert stats['bytes'] == os.path.getsize(stats['path']) and stats['removed'] == []
+    assert [s['path'] for s in backup.list_snapshots()] == [stats['path']]
+    # 写した先は WAL を使わない1つのファイル
+    assert not os.path.exists(stats['path'] + '-wal')
+    assert not os.path.exists(stats['path'] + '.tmp')
+
+def _write_between_steps(monkeypatch, count):
+    # 1ステップ写すごとの休みの間に、アプリの接続から count 回まで打刻相当の書き込みを入れる
+    writes = iter(range(1, count + 1))
+
+    def sleep(_):
+        d = next(writes, None)
+        if d is not None:
+            _record('b', date(2025, 1, d), note="y")
+    monkeypatch.setattr(backup, 'time', SimpleNamespace(perf_counter=time.perf_counter, sleep=sleep))
+
+def test_copy_restarts_when_the_source_changes(db, tmp_path, monkeypatch):
+    for d in range(1, 29):
+        _record('a', date(2025, 2, d), note="x" * 2000)
+    _write_between_steps(monkeypatch, 3)
+    dest = str(tmp_path / 'copy.db')
+    stats = backup.copy_database(database.DB_NAME, dest, pages=4, pause=0)
+    assert stats['restarts'] == 3 and not stats['whole']
+    assert backup.check_integrity(dest) == []
+    # 最後の書き込みまで写っている
+    with sqlite3.connect(dest) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM attendance WHERE user_id='b'").fetchone()[0] == 3
+
+def test_copy_falls_back_to_one_step_when_writes_never_stop(db, tmp_path, monkeypatch):
+    for d in range(1, 29):
+        _record('a', date(2025, 2, d), note="x" * 2000)
+    _write_between_steps(monkeypatch, 31)
+    dest = str(tmp_path / 'copy.db')
+    stats = backup.copy_database(database.DB_NAME, dest, pages=4, pause=0)
+    assert stats['whole'] and stats['restarts'] == backup.MAX_RESTARTS + 1
+    assert backup.check_integrity(dest) == []
+
+def test_rotate_keeps_recent_and_daily(db):
+    directory = backup.backup_dir()
+    os.makedirs(directory)
+    now = datetime(2025, 4, 30, 12, 0, 0)
+    stem = os.path.splitext(os.path.basename(database.DB_NAME))[0]
+    names = []
+    for i in range(10):
+        # 1日に2つずつ、5日分
+        t = now - timedelta(days=i // 2, hours=i % 2)
+        names.append(f"{stem}_{t:%Y%m%d_%H%M%S}.db")
+        open(os.path.join(directory, names[-1]), 'wb').close()
+    # 名前の形が違うファイル（復元前の退避など）は整理しない
+    open(os.path.join(directory, f"{stem}_20250101_000000_before_restore.db"), 'wb').close()
+    removed = backup.rotate(keep_last=3, keep_daily=3)
+    kept = sorted(os.listdir(directory))
+    # 新しい3つ（4/30 の2つと 4/29 の新しい方）と、新しい方から3日分の各日の最後（4/28 の新しい方）
+    assert sorted(os.path.basename(p) for p in removed) == sorted(names[i] for i in (3, 5, 6, 7, 8, 9))
+    assert kept == sorted([names[i] for i in (0, 1, 2, 4)] + [f"{stem}_20250101_000000_before_restore.db"])
+
+def test_restore_brings_back_the_snapshot(db):
+    _record('a', date(2025, 4, 1), start_min=510, end_min=1035)
+    snap = backup.snapshot()['path']
+    _record('a', date(2025, 4, 1), start_min=600, end_min=1035)
+    _record('b', date(2025, 4, 2), note="後から")
+    assert database.get_monthly_records('a', 2025, 4)[1]['start_min'] == 600
+    version = database.get_month_version('a', 2025, 4)
+
+    result = backup.restore(snap)
+    assert os.path.exists(result['saved']) and result['saved'].endswith('_before_restore.db')
+    assert database.get_monthly_records('a', 2025, 4)[1]['start_min'] == 510
+    assert database.get_monthly_records('b', 2025, 4) == {}
+    # version は復元前より大きく、キャッシュの古い月は使われない
+    assert database.get_month_version('a', 2025, 4) > version
+    assert database.verify_monthly_summary() == []
+    # 退避したファイルは整理の対象にならない
+    assert result['saved'] not in [s['path'] for s in backup.list_snapshots()]
+
+def test_restore_refuses_a_broken_snapshot(db, tmp_path):
+    _record('a', date(2025, 4, 1), note="残る")
+    broken = tmp_path / 'broken.db'
+    broken.write_bytes(b"not a database" * 100)
+    with pytest.raises(ValueError):
+        backup.restore(str(broken))
+    assert database.get_monthly_records('a', 2025, 4)[1]['note'] == "残る"
+    assert not os.path.exists(backup.backup_dir())
+
+def test_restore_brings_back_missing_archives(db):
+    _record('a', date(2019, 6, 10), start_min=510, end_min=1035)
+    database.archive_year(2019)
+    snap = backup.snapshot()
+    assert snap['archives'] == 1
+    path = database.get_archived_years()[2019]
+    database.close_connection()
+    os.remove(path)
+    backup.restore(snap['path'])
+    assert os.path.exists(path)
+    assert database.verify_archives() == []
+    assert database.get_records_between('a', date(2019, 1, 1), date(2020, 1, 1))[0]['start_min'] == 510
\ No newline at end of file
@@ -0,0 +1,117 @@
+from datetime import date
+import pandas as pd
+import pytest
+import database
+import export
+import importer
+
+# --- 勤怠データの一括取り込み ---
+
+def _table(rows, columns=('氏名', '日付', '出勤', '退勤')):
+    return pd.DataFrame(rows, columns=list(columns), dtype=str)
+
+def test_rejected_later_row_does_not_drop_the_valid_one(db):
+    good, _, rejected = importer.validate(_table([
+        ['a', '2025-04-01', '08:30', '17:15'],
+        ['a', '2025-04-01', '25:00', '17:15'],
+    ]))
+    assert good[['user_id', 'date', 'start_min']].values.tolist() == [['a', '2025-04-01', 510]]
+    assert rejected['行'].tolist() == [3]
+    assert rejected['理由'].str.contains("出勤は HH:MM").all()
+
+def test_last_valid_row_wins_for_the_same_day(db):
+    good, _, rejected = importer.validate(_table([
+        ['a', '2025-04-01', '08:30', '17:15'],
+        ['a', '2025/4/1', '09:00', '18:00'],
+    ]))
+    assert good['start_min'].tolist() == [540]
+    assert rejected['行'].tolist() == [2]
+    assert rejected['理由'].tolist() == ["同じ日の行が後にもあります。"]
+def test_rejection_rules(db):
+    table = _table([
+        ['a', '2025-04-01', '08:30', '17:15', '1'],
+        ['x', '2025-04-02', '08:30', '17:15', '1'],
+        ['a', '2025-13-01', '08:30', '17:15', '1'],
+        ['a', '2025-04-03', '8時30分', '17:15', '1'],
+        ['a', '2025-04-04', '17:15', '08:30', '1'],
+        ['a', '2025-04-05', '08:30', '17:15', '-1'],
+        ['', '', '', '', ''],
+        ['b', '2025-04-06', '０９：００', '1035', '0.75'],
+    ], columns=('氏名', '日付', '出勤', '退勤', '実績休憩'))
+    good, fields, rejected = importer.validate(table)
+    assert fields == ['start_min', 'end_min', 'break_duration']
+    assert good[['user_id', 'date', 'start_min', 'end_min', 'break_duration']].values.tolist() == [
+        ['a', '2025-04-01', 510, 1035, 60], ['b', '2025-04-06', 540, 1035, 45]]
+    # 行番号は見出しを1行目として数える。空行は除外せず飛ばす
+    assert dict(zip(rejected['行'], rejected['理由'])) == {
+        3: "氏名が登録されていません。",
+        4: "日付が正しくありません。",
+        5: "出勤は HH:MM で入力してください。",
+        6: "退勤が出勤より前です。",
+        7: "実績休憩は0以上の数で入力してください。",
+    }
+
+def test_required_columns(db):
+    with pytest.raises(ValueError):
+        importer.validate(_table([['a', '08:30']], columns=('氏名', '出勤')))
+
+def test_actual_hours_become_manual_time_only_without_punches(db):
+    good, fields, _ = importer.validate(_table([
+        ['a', '2025-04-01', '', '', '7.5'],
+        ['a', '2025-04-02', '08:30', '17:15', '7.75'],
+    ], columns=('氏名', '日付', '出勤', '退勤', '実績時間')))
+    assert 'manual_work_time' in fields
+    assert good['manual_work_time'].tolist()[0] == 450
+    assert pd.isna(good['manual_work_time'].tolist()[1])
+
+def test_archived_years_are_rejected(db):
+    database.upsert_attendance_record('a', date(2019, 6, 10), note="x")
+    database.archive_year(2019)
+    good, _, rejected = importer.validate(_table([
+        ['a', '2019-06-11', '08:30', '17:15'],
+        ['a', '2020-06-11', '08:30', '17:15'],
+    ]))
+    assert good['date'].tolist() == ['2020-06-11']
+    assert rejected['理由'].tolist() == ["アーカイブ済みの年の記録は変更できません。"]
+
+def test_dry_run_writes_nothing(db):
+    table = _table([['a', '2025-04-01', '08:30', '17:15'], ['x', '2025-04-02', '08:30', '17:15']])
+    result = importer.import_table(table, dry_run=True)
+    assert (result['rows'], result['loaded'], len(result['rejected'])) == (2, 0, 1)
+    assert database.get_record_dates(date(2025, 1, 1), date(2026, 1, 1)) == set()
+
+def test_import_keeps_columns_that_are_not_in_the_file(db):
+    database.upsert_attendance_record('a', date(2025, 4, 1), note="メモ", start_min=480)
+    result = importer.import_table(_table([
+        ['a', '2025-04-01', '08:30', '17:15'],
+        ['b', '2025-04-02', '09:00', ''],
+    ]))
+    assert (result['rows'], result['loaded'], len(result['rejected'])) == (2, 2, 0)
+    records = database.get_monthly_records('a', 2025, 4)
+    assert (records[1]['start_min'], records[1]['end_min'], records[1]['note']) == (510, 1035, "メモ")
+    b = database.get_monthly_records('b', 2025, 4)[2]
+    assert (b['start_min'], b['end_min']) == (540, None)
+    # 月次サマリーもトリガーで更新されている
+    assert database.verify_monthly_summary() == []
+    assert database.get_monthly_summary('a', 2025, 4)['actual_work'] == 1035 - 510 - 60
+
+def test_exported_file_imports_back(db, tmp_path):
+    database.upsert_attendance_records('a', {
+        date(2025, 4, 1): {'start_min': 510, 'end_min': 1035, 'break_duration': 45, 'note': "メモ"},
+        date(2025, 4, 2): {'manual_work_time': 120, 'leave_type': '有給休暇'},
+    })
+    path = tmp_path / 'export.csv'
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        export.write_csv(f, date(2025, 4, 1), date(2025, 5, 1))
+    before = database.get_monthly_records('a', 2025, 4)
+    summary = database.get_monthly_summary('a', 2025, 4)
+    result = importer.import_table(importer.read_table(str(path)))
+    assert result['rejected'].empty
+    after = database.get_monthly_records('a', 2025, 4)
+    for day in (1, 2):
+        for f in ('start_min', 'end_min', 'manual_work_time', 'leave_type', 'note'):
+            assert after[day][f] == before[day][f], (day, f)
+    # 打刻の無い日の休憩は書き出しでは既定の60分になるが、勤務時間の計算には使われない
+    assert after[1]['break_duration'] == 45
+    after_summary = database.get_monthly_summary('a', 2025, 4)
+    assert {f: after_summary[f] for f in database.SUMMARY_FIELDS} == {f: summary[f] for f in database.SUMMARY_FIELDS}
\ No newline at end of file
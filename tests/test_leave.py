@@ -0,0 +1,90 @@
+from datetime import date
+import database
+import leave
+
+# --- 休暇台帳 ---
+
+def _take(user_id, leave_type, *days):
+    database.upsert_attendance_records(user_id, {d: {'leave_type': leave_type} for d in days}, fields=['leave_type'])
+
+def _setup_2024():
+    database.add_leave_grant('a', '有給休暇', date(2024, 4, 1), 10)
+    database.add_leave_grant('a', '特別休暇', date(2024, 4, 1), 2)
+    database.add_leave_grant('b', '有給休暇', date(2024, 4, 1), 5)
+    _take('a', '有給休暇', date(2024, 5, 7), date(2024, 5, 8), date(2024, 8, 13))
+    _take('b', '有給休暇', *[date(2024, 6, d) for d in range(3, 9)])
+    _take('a', '休日勤務', date(2024, 6, 1), date(2024, 6, 2))
+    _take('a', '振替休暇', date(2024, 5, 31), date(2024, 6, 3))
+    _take('c', '振替休暇', date(2024, 7, 1))
+    # 休暇でない日（leave_type が NULL）は数えない
+    database.upsert_attendance_record('a', date(2024, 5, 9), start_min=510, end_min=1035)
+
+def test_balances(db):
+    _setup_2024()
+    b = leave.year_balances(2024)
+    assert b['a']['有給休暇'] == {'granted': 10, 'carried': 0, 'used': 3, 'balance': 7}
+    assert b['a']['特別休暇'] == {'granted': 2, 'carried': 0, 'used': 0, 'balance': 2}
+    # 振替休暇の付与は休日勤務の日数
+    assert b['a']['振替休暇'] == {'granted': 2, 'carried': 0, 'used': 2, 'balance': 0}
+    assert b['b']['有給休暇']['balance'] == -1
+    assert b['c']['振替休暇'] == {'granted': 0, 'carried': 0, 'used': 1, 'balance': -1}
+    # 期間外の年には数えない
+    assert leave.year_balances(2025)['a']['有給休暇'] == {'granted': 0, 'carried': 0, 'used': 0, 'balance': 0}
+    only_b = database.get_leave_balances(date(2024, 1, 1), date(2025, 1, 1), ['有給休暇'], ['b'])
+    assert [(r['user_id'], r['used']) for r in only_b] == [('b', 6)]
+
+def test_carry_over_is_capped_and_replaces_the_previous_run(db):
+    _setup_2024()
+    assert leave.carry_over(2024) == 1
+    assert leave.year_balances(2025)['a']['有給休暇'] == {'granted': 0, 'carried': 7, 'used': 0, 'balance': 7}
+    # 残りが付与を超えていても、繰り越すのはその年の付与まで
+    database.add_leave_grant('c', '有給休暇', date(2024, 1, 1), 3)
+    database.add_leave_grant('c', '有給休暇', date(2024, 1, 1), 20, kind='carryover')
+    _take('a', '有給休暇', date(2024, 12, 2))
+    assert leave.carry_over(2024) == 2
+    grants = database.get_leave_grants(date(2025, 1, 1), date(2025, 1, 2))
+    assert sorted((g['user_id'], g['days'], g['kind']) for g in grants) == [('a', 6, 'carryover'), ('c', 3, 'carryover')]
+
+def test_substitute_days_pair_oldest_first(db):
+    _setup_2024()
+    pairs = leave.pair_substitute_days(date(2024, 1, 1), date(2025, 1, 1))
+    # 先に取った振替休暇（前借り）も後の休日勤務と組になる
+    assert pairs['a'] == {'pairs': [('2024-06-01', '2024-05-31'), ('2024-06-02', '2024-06-03')],
+                          'unpaired_work': [], 'unpaired_leave': []}
+    assert pairs['c'] == {'pairs': [], 'unpaired_work': [], 'unpaired_leave': ['2024-07-01']}
+    assert 'b' not in pairs
+
+def test_archived_years_are_counted(db):
+    _setup_2024()
+    before = leave.year_balances(2024)
+    pairs = leave.pair_substitute_days(date(2024, 1, 1), date(2025, 1, 1))
+    database.archive_year(2024)
+    assert leave.year_balances(2024) == before
+    assert leave.pair_substitute_days(date(2024, 1, 1), date(2025, 1, 1)) == pairs
+
+def test_leave_days_use_the_leave_index(db):
+    _setup_2024()
+    sql, params = database._leave_days_sql(date(2024, 1, 1), date(2025, 1, 1), database.LEAVE_LEDGER_TYPES)
+    with database.read_cursor() as c:
+        plan = " ".join(r['detail'] for r in c.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+    assert 'idx_attendance_leave' in plan
+    days = database.get_leave_days(date(2024, 5, 1), date(2024, 6, 1), ['有給休暇', '振替休暇'], ['a'])
+    assert [(r['leave_type'], r['date']) for r in days] == [
+        ('振替休暇', '2024-05-31'), ('有給休暇', '2024-05-07'), ('有給休暇', '2024-05-08')]
+def test_empty_text_is_stored_as_null(db):
+    # 以前の編集モードが '' で保存した行は、移行で NULL になり休暇の索引から外れる
+    with database.transaction() as c:
+        c.executemany("INSERT INTO attendance (user_id, date, start_min, leave_type, note) VALUES (?, ?, ?, ?, ?)",
+                      [('a', '2024-05-01', 510, '', ''), ('a', '2024-05-02', 510, ' ', 'メモ'),
+                       ('a', '2024-05-03', None, '有給休暇', ' ')])
+        c.execute("PRAGMA user_version = 5")
+    summary = database.get_monthly_summary('a', 2024, 5)
+    database.migrate()
+    with database.read_cursor() as c:
+        rows = c.execute("SELECT leave_type, note FROM attendance ORDER BY date").fetchall()
+        indexed = c.execute("SELECT COUNT(*) FROM attendance INDEXED BY idx_attendance_leave "
+                            "WHERE leave_type IS NOT NULL").fetchone()[0]
+    assert [tuple(r) for r in rows] == [(None, None), (None, 'メモ'), ('有給休暇', None)]
+    assert indexed == 1
+    after = database.get_monthly_summary('a', 2024, 5)
+    assert {f: after[f] for f in database.SUMMARY_FIELDS} == {f: summary[f] for f in database.SUMMARY_FIELDS}
\ No newline at end of file
@@ -0,0 +1,23 @@
+from datetime import date
+import reports
+import schedule
+
+# --- 勤務パターンごとの出勤日 ---
+
+def test_workdays_in_month_by_pattern():
+    # 2025年5月: 土曜が5日・日曜が4日。祝日は3日（土）・4日（日）・5日・6日（振替休日）
+    assert schedule.workdays_in_month("sh", 2025, 5) == 20
+    assert schedule.workdays_in_month("sat", 2025, 5) == 26
+    assert schedule.workdays_in_month("sat_holi", 2025, 5) == 23
+    assert sum(schedule.workdays_in_month("sh", 2025, m) for m in range(1, 13)) == \
+        schedule.workdays_between("sh", date(2025, 1, 1), date(2026, 1, 1))
+
+def test_unknown_pattern_counts_every_day():
+    assert schedule.workdays_in_month("", 2025, 5) == 31
+    assert schedule.workdays_in_month(None, 2024, 2) == 29
+
+def test_reports_count_the_days_the_schedule_creates():
+    # 年末までの残りの出勤日は、予定を作る日（workday_mask）と同じ数え方になる
+    for holiday_type in ("sh", "sun_holi", "", None):
+        rows = schedule.build_schedule_rows("08:30", "17:15", holiday_type, date(2025, 10, 18), date(2026, 1, 1))
+        assert reports.remaining_workdays(holiday_type, 2025, date(2025, 10, 17)) == len(rows)
\ No newline at end of file
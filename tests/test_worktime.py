@@ -0,0 +1,123 @@
+import sqlite3
+from datetime import date, datetime, time
+import numpy as np
+import pandas as pd
+import pytest
+import database
+import worktime
+
+# --- 勤務時間の計算（worktime）と、旧形式の時刻の移行 ---
+
+def _compute(**cols):
+    return worktime.compute(pd.DataFrame(cols))
+
+def test_plan_break_defaults_when_zero_or_missing():
+    out = _compute(plan_start=[510, 510, 510], plan_end=[1035, 1035, 1035], plan_break=[0, None, 45])
+    assert out['plan_break_eff'].tolist() == [60, 60, 45]
+    assert out['plan_work'].tolist() == [465, 465, 480]
+
+def test_actual_break_defaults_only_when_missing():
+    out = _compute(start=[510, 510], end=[1035, 1035], **{'break': [None, 0]})
+    assert out['actual_break_eff'].tolist() == [60, 0]
+    assert out['actual_work'].tolist() == [465, 525]
+
+def test_missing_columns_are_treated_as_empty():
+    out = worktime.compute(pd.DataFrame({'manual': [120]}))
+    assert out['plan_work'].tolist() == [0]
+    assert out['actual_work'].tolist() == [120]
+
+def test_manual_time_used_only_without_both_punches():
+    out = _compute(start=[510, 510, None, None], end=[1035, None, None, 1035], manual=[999, 90, 120, None])
+    # 出勤・退勤がそろっていれば手入力は使わない。どちらか欠けていれば手入力（無ければ 0）
+    assert out['actual_work'].tolist() == [465, 90, 120, 0]
+    assert out['actual_break_used'].tolist() == [60, 0, 0, 0]
+
+def test_work_is_never_negative_and_overtime_is_excess_only():
+    out = _compute(plan_start=[540, 540], plan_end=[570, 1020], plan_break=[60, 60],
+                   start=[540, 540], end=[600, 900], **{'break': [0, 60]})
+    assert out['plan_work'].tolist() == [0, 420]
+    assert out['overtime'].tolist() == [60, 0]
+    t = worktime.totals(out)
+    assert (t['plan_days'], t['work_days'], t['overtime']) == (1, 2, 60.0)
+
+def test_full_width_input():
+    assert worktime.parse_hhmm("０８：３０") == 510
+    assert worktime.to_minutes("１７：１５") == 1035
+    minutes, bad = worktime.parse_hhmm_series(pd.Series(["０８：３０", " 9:05 ", "17:15"]))
+    assert minutes.tolist() == [510, 545, 1035]
+    assert not bad.any()
+
+def test_invalid_times():
+    with pytest.raises(ValueError):
+        worktime.parse_hhmm("25:00")
+    with pytest.raises(ValueError):
+        worktime.to_minutes("8時30分")
+    minutes, bad = worktime.parse_hhmm_series(pd.Series(["24:00", "8:60", "abc", "", None, "23:59"]))
+    assert bad.tolist() == [True, True, True, False, False, False]
+    assert minutes.isna().tolist() == [True, True, True, True, True, False]
+
+def test_to_minutes_accepts_each_stored_form():
+    assert worktime.to_minutes(datetime(2025, 4, 1, 8, 30, 59)) == 510
+    assert worktime.to_minutes(time(17, 15)) == 1035
+    assert worktime.to_minutes("2025-04-01 08:30:00") == 510
+    assert worktime.to_minutes("2025-04-01T08:30") == 510
+    assert worktime.to_minutes(np.int64(600)) == 600
+    assert worktime.to_minutes(None) is None
+    assert worktime.to_minutes("") is None
+    assert worktime.to_minutes(date(2025, 4, 1)) is None
+
+def test_format_minutes_round_trip():
+    assert worktime.format_minutes(510) == "08:30"
+    assert worktime.format_minutes(None) == ""
+    assert worktime.format_minutes(float('nan')) == ""
+    assert worktime.parse_hhmm(worktime.format_minutes(1035)) == 1035
+
+# 以前の版の attendance（時刻が 'YYYY-MM-DD HH:MM:SS' の文字列、user_version = 0）
+BASELINE_ATTENDANCE = '''CREATE TABLE attendance
+    (user_id TEXT, date TEXT,
+     start_time TEXT, end_time TEXT,
+     break_duration INTEGER, manual_work_time INTEGER, note TEXT,
+     scheduled_start_time TEXT, scheduled_end_time TEXT, scheduled_break_duration INTEGER,
+     work_tag TEXT, leave_type TEXT, practice_duration INTEGER,
+     PRIMARY KEY (user_id, date))'''
+
+@pytest.fixture
+def baseline_db(tmp_path, monkeypatch):
+    path = str(tmp_path / 'attendance.db')
+    conn = sqlite3.connect(path)
+    conn.execute(BASELINE_ATTENDANCE)
+    conn.executemany("INSERT INTO attendance VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        ('a', '2025-04-01', '2025-04-01 08:31:59', '2025-04-01 17:20:00', 60, None, 'メモ',
+         '2025-04-01 08:30:00', '2025-04-01 17:15:00', 0, 'Office', None, None),
+        ('a', '2025-04-02', '', None, None, 120, None, None, None, None, 'Academy', '有給休暇', 30),
+    ])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(database, 'DB_NAME', path)
+    yield path
+    database.close_connection()
+
+def test_migrate_legacy_time_columns(baseline_db):
+    before, after = database.migrate()
+    assert before == 0 and after == len(database._migrations())
+    rows = {r['date']: r for r in database.get_records_between('a', date(2025, 4, 1), date(2025, 5, 1))}
+    first, second = rows['2025-04-01'], rows['2025-04-02']
+    # 秒は切り捨て、空文字と NULL は NULL
+    assert (first['start_min'], first['end_min']) == (511, 1040)
+    assert (first['scheduled_start_min'], first['scheduled_end_min']) == (510, 1035)
+    assert (second['start_min'], second['end_min']) == (None, None)
+    # 時刻以外の列はそのまま
+    assert (first['note'], first['work_tag'], second['manual_work_time'], second['leave_type']) == \
+        ('メモ', 'Office', 120, '有給休暇')
+    with database.read_cursor() as c:
+        columns = {r['name'] for r in c.execute("PRAGMA table_info(attendance)")}
+    assert not columns & set(database.LEGACY_TIME_COLUMNS)
+    # 月次サマリーは移行後の値から作られる（予定 465分、実績 469分）
+    summary = database.get_monthly_summary('a', 2025, 4)
+    assert (summary['plan_work'], summary['actual_work']) == (465, 469 + 120)
+    assert database.verify_monthly_summary() == []
+
+def test_migrate_is_idempotent(baseline_db):
+    database.migrate()
+    version = database.get_schema_version()
+    assert database.migrate() == (version, version)
\ No newline at end of file
@@ -1,61 +1,144 @@
-from datetime import date
-
-# Hardcoded holidays for 2024-2025 (Simplified List)
-# Ideally this should be a library or API, but for standalone stability efficiently:
-HOLIDAYS = {
-    # 2024
-    date(2024, 1, 1): "元日",
-    date(2024, 1, 8): "成人の日",
-    date(2024, 2, 11): "建国記念の日",
-    date(2024, 2, 12): "振替休日",
-    date(2024, 2, 23): "天皇誕生日",
-    date(2024, 3, 20): "春分の日",
-    date(2024, 4, 29): "昭和の日",
-    date(2024, 5, 3): "憲法記念日",
-    date(2024, 5, 4): "みどりの日",
-    date(2024, 5, 5): "こどもの日",
-    date(2024, 5, 6): "振替休日",
-    date(2024, 7, 15): "海の日",
-    date(2024, 8, 11): "山の日",
-    date(2024, 8, 12): "振替休日",
-    date(2024, 9, 16): "敬老の日",
-    date(2024, 9, 22): "秋分の日",
-    date(2024, 9, 23): "振替休日",
-    date(2024, 10, 14): "スポーツの日",
-    date(2024, 11, 3): "文化の日",
-    date(2024, 11, 4): "振替休日",
-    date(2024, 11, 23): "勤労感謝の日",
-    date(2024, 12, 28): "年末年始", # Custom Company Holiday?
-    date(2024, 12, 29): "年末年始",
-    date(2024, 12, 30): "年末年始",
-    date(2024, 12, 31): "年末年始",
-    
-    # 2025
-    date(2025, 1, 1): "元日",
-    date(2025, 1, 2): "正月",
-    date(2025, 1, 3): "正月",
-    date(2025, 1, 13): "成人の日",
-    date(2025, 2, 11): "建国記念の日",
-    date(2025, 2, 23): "天皇誕生日",
-    date(2025, 2, 24): "振替休日",
-    date(2025, 3, 20): "春分の日",
-    date(2025, 4, 29): "昭和の日",
-    date(2025, 5, 3): "憲法記念日",
-    date(2025, 5, 4): "みどりの日",
-    date(2025, 5, 5): "こどもの日",
-    date(2025, 5, 6): "振替休日",
-    date(2025, 7, 21): "海の日",
-    date(2025, 8, 11): "山の日",
-    date(2025, 9, 15): "敬老の日",
-    date(2025, 9, 23): "秋分の日",
-    date(2025, 10, 13): "スポーツの日",
-    date(2025, 11, 3): "文化の日",
-    date(2025, 11, 23): "勤労感謝の日",
-    date(2025, 11, 24): "振替休日", 
+import calendar
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# jpholiday があればその祝日データを使い、無ければ下の規則から祝日を計算する
+try:
+    import jpholiday
+except ImportError:
+    jpholiday = None
+
+# 会社の休業日（年末年始）。毎年同じ月日で、祝日と同じく休み扱い
+COMPANY_CLOSURES = {
+    (12, 28): "年末年始",
+    (12, 29): "年末年始",
+    (12, 30): "年末年始",
+    (12, 31): "年末年始",
+    (1, 2): "正月",
+    (1, 3): "正月",
+}
+
+# 法律で個別に移動・追加された祝日（規則では求められないもの）
+SPECIAL_HOLIDAYS = {
+    2019: {date(2019, 5, 1): "天皇の即位の日", date(2019, 10, 22): "即位礼正殿の儀"},
+    2020: {date(2020, 7, 23): "海の日", date(2020, 7, 24): "スポーツの日", date(2020, 8, 10): "山の日"},
+    2021: {date(2021, 7, 22): "海の日", date(2021, 7, 23): "スポーツの日", date(2021, 8, 8): "山の日"},
 }
+MOVED_HOLIDAYS = {"海の日", "スポーツの日", "山の日"}
+
+def _nth_monday(year, month, n):
+    first = date(year, month, 1)
+    return first + timedelta(days=(7 - first.weekday()) % 7 + 7 * (n - 1))
+
+def _equinox_day(year, base):
+    # 春分・秋分の日の近似式（1980〜2099年）
+    return int(base + 0.242194 * (year - 1980) - int((year - 1980) / 4))
+
+def _national_holidays_by_rule(year):
+    """
+    祝日法（2007年以降）の規則から、その年の国民の祝日・国民の休日・振替休日を求める
+    """
+    h = {
+        date(year, 1, 1): "元日",
+        _nth_monday(year, 1, 2): "成人の日",
+        date(year, 2, 11): "建国記念の日",
+        date(year, 3, _equinox_day(year, 20.8431)): "春分の日",
+        date(year, 4, 29): "昭和の日",
+        date(year, 5, 3): "憲法記念日",
+        date(year, 5, 4): "みどりの日",
+        date(year, 5, 5): "こどもの日",
+        _nth_monday(year, 7, 3): "海の日",
+        _nth_monday(year, 9, 3): "敬老の日",
+        date(year, 9, _equinox_day(year, 23.2488)): "秋分の日",
+        _nth_monday(year, 10, 2): "スポーツの日" if year >= 2020 else "体育の日",
+        date(year, 11, 3): "文化の日",
+        date(year, 11, 23): "勤労感謝の日",
+    }
+    if year >= 2020:
+        h[date(year, 2, 23)] = "天皇誕生日"
+    elif year <= 2018:
+        h[date(year, 12, 23)] = "天皇誕生日"
+    if year >= 2016:
+        h[date(year, 8, 11)] = "山の日"
+    if year in SPECIAL_HOLIDAYS:
+        if year in (2020, 2021):
+            h = {d: n for d, n in h.items() if n not in MOVED_HOLIDAYS}
+        h.update(SPECIAL_HOLIDAYS[year])
+
+    # 国民の休日: 前日と翌日がどちらも祝日の日
+    for d in sorted(h):
+        between = d + timedelta(days=1)
+        if between not in h and between + timedelta(days=1) in h and between.weekday() != 6:
+            h[between] = "国民の休日"
+
+    # 振替休日: 祝日が日曜日なら、その後の最初の祝日でない日
+    for d in sorted(h):
+        if d.weekday() == 6:
+            sub = d + timedelta(days=1)
+            while sub in h:
+                sub += timedelta(days=1)
+            h[sub] = "振替休日"
+    return h
+
+@lru_cache(maxsize=None)
+def holidays(year):
+    """
+    その年の休日（国民の祝日＋会社の休業日）を {日付: 名前} で返す。年ごとに1回だけ作る
+    """
+    if jpholiday is not None:
+        h = dict(jpholiday.year_holidays(year))
+    else:
+        h = _national_holidays_by_rule(year)
+    for (m, d), name in COMPANY_CLOSURES.items():
+        h.setdefault(date(year, m, d), name)
+    return h
+
+def _as_date(date_obj):
+    return date_obj.date() if isinstance(date_obj, datetime) else date_obj
 
 def is_jp_holiday(date_obj):
-    return date_obj in HOLIDAYS
+    date_obj = _as_date(date_obj)
+    return date_obj in holidays(date_obj.year)
 
 def get_holiday_name(date_obj):
-    return HOLIDAYS.get(date_obj)
+    date_obj = _as_date(date_obj)
+    return holidays(date_obj.year).get(date_obj)
+
+# --- 出勤日の索引 ---
+# 1年分の出勤日を 1月1日を0番目としたビット列で持ち、累積和で期間内の日数を O(1) で数える
+
+@lru_cache(maxsize=None)
+def workday_index(year, off_weekdays=(5, 6), holidays_off=True):
+    """
+    (出勤日ビット列, 累積和) を返す。bitmap[i] は i 日目が出勤日なら 1、
+    prefix[i] は i 日目より前の出勤日数（prefix[0] = 0）
+    """
+    h = holidays(year) if holidays_off else {}
+    jan1 = date(year, 1, 1)
+    days = 366 if calendar.isleap(year) else 365
+    bitmap = bytearray(days)
+    prefix = [0] * (days + 1)
+    for i in range(days):
+        d = jan1 + timedelta(days=i)
+        bitmap[i] = 0 if (d.weekday() in off_weekdays or d in h) else 1
+        prefix[i + 1] = prefix[i] + bitmap[i]
+    return bytes(bitmap), tuple(prefix)
+
+def is_workday(date_obj, off_weekdays=(5, 6), holidays_off=True):
+    date_obj = _as_date(date_obj)
+    bitmap, _ = workday_index(date_obj.year, tuple(off_weekdays), holidays_off)
+    return bool(bitmap[date_obj.timetuple().tm_yday - 1])
+
+def business_days_between(start, end, off_weekdays=(5, 6), holidays_off=True):
+    """
+    start <= 日付 < end の出勤日数。年ごとの累積和の差で数える
+    """
+    start, end = _as_date(start), _as_date(end)
+    total = 0
+    for year in range(start.year, end.year + 1):
+        _, prefix = workday_index(year, tuple(off_weekdays), holidays_off)
+        lo = (start - date(year, 1, 1)).days if year == start.year else 0
+        hi = (end - date(year, 1, 1)).days if year == end.year else len(prefix) - 1
+        if hi > lo:
+            total += prefix[hi] - prefix[lo]
+    return total
\ No newline at end of file
@@ -0,0 +1,126 @@
+from datetime import date, datetime, time
+import numpy as np
+import pandas as pd
+
+# --- 勤務時間の計算 ---
+# 時刻はすべて0時からの分数（整数）で扱う。データベースを使わない純粋な計算だけを置く
+
+DEFAULT_BREAK = 60  # 休憩の既定（分）
+
+# 全角数字・全角コロンを半角にする
+_HALF_WIDTH = str.maketrans({**{chr(0xFF10 + i): chr(0x30 + i) for i in range(10)}, "：": ":"})
+
+def normalize_time_str(t_str):
+    if not t_str: return ""
+    return str(t_str).translate(_HALF_WIDTH).strip()
+
+def parse_hhmm(t_str):
+    """
+    'HH:MM'（全角も可）を分数にする。空なら None、形式が正しくなければ ValueError
+    """
+    t_str = normalize_time_str(t_str)
+    if not t_str:
+        return None
+    t = datetime.strptime(t_str, "%H:%M")
+    return t.hour * 60 + t.minute
+
+def normalize_series(s):
+    # normalize_time_str の列版（空は ""）
+    return s.fillna("").astype(str).str.translate(_HALF_WIDTH).str.strip()
+
+def parse_hhmm_series(s):
+    """
+    parse_hhmm の列版。文字列の列をまとめて分数にする
+    (分数の列（空や不正は NaN）, 形式が正しくない行の真偽の列) を返す
+    """
+    norm = normalize_series(s)
+    parts = norm.str.extract(r'^(\d{1,2}):(\d{1,2})$')
+    h = pd.to_numeric(parts[0], errors='coerce')
+    m = pd.to_numeric(parts[1], errors='coerce')
+    ok = (h < 24) & (m < 60)
+    return (h * 60 + m).where(ok), (norm != "") & ~ok
+
+def to_minutes(val):
+    """
+    datetime / time / 'YYYY-MM-DD HH:MM:SS' / 'HH:MM' / 分数 を0時からの分数にそろえる（秒は切り捨て）
+    """
+    if val is None or val == "":
+        return None
+    if isinstance(val, (datetime, time)):
+        return val.hour * 60 + val.minute
+    if isinstance(val, date):
+        return None
+    if isinstance(val, (int, np.integer)):
+        return int(val)
+    val = str(val)
+    if len(val) >= 16 and val[4] == '-' and val[10] in ' T':
+        val = val[11:16]
+    return parse_hhmm(val)
+
+def format_minutes(minutes):
+    if minutes is None or pd.isna(minutes):
+        return ""
+    minutes = int(minutes)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+# 計算に使う列（分）。欠けている時刻は NaN
+INPUT_COLUMNS = ['plan_start', 'plan_end', 'plan_break', 'start', 'end', 'break', 'manual']
+
+def compute(df):
+    """
+    1行1日の DataFrame から、予定・実績の時間をまとめて計算する（ループしない）
+    入力列は INPUT_COLUMNS。次の列を足した DataFrame を返す（いずれも分）
+      plan_break_eff / actual_break_eff : 表示用の休憩（未入力なら既定値）
+      plan_work    : 予定時間 = 予定終了 - 予定開始 - 予定休憩（0未満は0）
+      actual_work  : 実績時間。出勤・退勤がそろっていなければ手入力の時間
+      plan_break_used / actual_break_used : 予定・実績がある日だけの休憩（合計用）
+      overtime     : 実績のうち予定を超えた分
+    予定休憩は 0 や未入力なら既定値、実績休憩は未入力のときだけ既定値になる（勤怠表の従来の規則）
+    """
+    out = df.copy()
+    for col in INPUT_COLUMNS:
+        out[col] = pd.to_numeric(out[col], errors='coerce') if col in out else np.nan
+    has_plan = out['plan_start'].notna() & out['plan_end'].notna()
+    has_actual = out['start'].notna() & out['end'].notna()
+    plan_break = out['plan_break'].fillna(0).replace(0, DEFAULT_BREAK)
+    actual_break = out['break'].fillna(DEFAULT_BREAK)
+
+    out['has_plan'] = has_plan
+    out['has_actual'] = has_actual
+    out['plan_break_eff'] = plan_break
+    out['actual_break_eff'] = actual_break
+    out['plan_work'] = np.where(has_plan, (out['plan_end'] - out['plan_start'] - plan_break).clip(lower=0), 0.0)
+    out['actual_work'] = np.where(has_actual, (out['end'] - out['start'] - actual_break).clip(lower=0),
+                                  out['manual'].fillna(0))
+    out['plan_break_used'] = np.where(has_plan, plan_break, 0.0)
+    out['actual_break_used'] = np.where(has_actual, actual_break, 0.0)
+    out['overtime'] = (out['actual_work'] - out['plan_work']).clip(lower=0)
+    return out
+
+def totals(computed):
+    # compute() の結果の合計（分）
+    return {
+        'plan_work': float(computed['plan_work'].sum()),
+        'plan_break': float(computed['plan_break_used'].sum()),
+        'actual_work': float(computed['actual_work'].sum()),
+        'actual_break': float(computed['actual_break_used'].sum()),
+        'overtime': float(computed['overtime'].sum()),
+        'plan_days': int((computed['plan_work'] > 0).sum()),
+        'work_days': int((computed['actual_work'] > 0).sum()),
+    }
+
+# attendance の列名 → compute() の入力列名
+DB_COLUMNS = {
+    'scheduled_start_min': 'plan_start', 'scheduled_end_min': 'plan_end',
+    'scheduled_break_duration': 'plan_break', 'start_min': 'start', 'end_min': 'end',
+    'break_duration': 'break', 'manual_work_time': 'manual',
+}
+
+def records_frame(records):
+    """
+    attendance の行（辞書）の並びを compute() に渡せる DataFrame にする
+    """
+    df = pd.DataFrame(list(records))
+    if df.empty:
+        df = pd.DataFrame(columns=['user_id', 'date'])
+    return df.rename(columns=DB_COLUMNS)
\ No newline at end of file